@@ -0,0 +1,289 @@
+"""
+benchmark.py
+Headless benchmark suite for gui_engine.py
+Generates synthetic pages, then measures Window construction time, goto_link navigation latency,
+Tcl command counts and peak RSS. Every scenario runs in its own subprocess so the peak RSS belongs to that scenario alone.
+
+Usage:
+    python benchmarks/benchmark.py                          run every scenario and print JSON
+    python benchmarks/benchmark.py -o results.json          save the results
+    python benchmarks/benchmark.py --compare results.json   compare against saved results, exits with 1 on a regression
+    python benchmarks/benchmark.py --scenario labels        run only some scenarios
+
+Tk needs an X display, if DISPLAY isn't set an Xvfb server is started for the run (run it under xvfb-run otherwise).
+"""
+
+import argparse
+import json
+import os
+import platform
+import resource
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0,ROOT)
+
+
+def page(body,title="Benchmark"):
+    return f"<html><head><title>{title}</title></head><body>{body}</body></html>"
+
+def gen_labels(n):
+    """n labels in a single column"""
+    return page("".join(f'<label row="{i}">label {i}</label>' for i in range(n)))
+
+def gen_nested(depth,width=3):
+    """divs nested depth deep, with width labels at every level"""
+    body = ""
+    for level in reversed(range(depth)):
+        labels = "".join(f'<label row="{i+1}">level {level} label {i}</label>' for i in range(width))
+        body = f'<div row="0">{body}</div>{labels}'
+    return page(f"<div>{body}</div>")
+
+def gen_listbox(n):
+    """a scrollbox with n items"""
+    return page('<scrollbox name="items" height="20">'+"".join(f"<li>item {i}</li>" for i in range(n))+"</scrollbox>")
+
+def gen_scrollframe(n):
+    """a scrolling div with n rows of a label and a button"""
+    rows = "".join(f'<div row="{i}"><label>row {i}</label><button action="noop" row="0" column="1">go</button></div>' for i in range(n))
+    return page(f'<div scrolling="true" height="400" width="300">{rows}</div>')
+
+def gen_gallery(n,directory):
+    """n images, each from its own generated JPEG"""
+    from PIL import Image
+    tags = []
+    for i in range(n):
+        path = os.path.join(directory,f"img{i}.jpg")
+        Image.new("RGB",(1600,1200),(i*37%256,i*91%256,i*53%256)).save(path,quality=85)
+        tags.append(f'<img src="{path}"/>')
+    return page("".join(tags))
+
+def gen_form(n):
+    """a form with n labelled text inputs, a select and a submit button"""
+    inputs = "".join(f'<label row="{i}" column="0">field {i}</label><input type="text" name="field{i}" row="{i}" column="1"/>' for i in range(n))
+    select = f'<select name="choice" row="{n}"><option value="a">a</option><option value="b">b</option></select>'
+    return page(f'<form>{inputs}{select}<input type="submit" text="Submit" row="{n+1}"/></form>')
+
+def gen_link_page():
+    return page('<button link="target.html">go</button>',title="Start")
+
+
+"""scenario name -> (what it measures, page generator taking the work directory)"""
+SCENARIOS = {
+    "labels":("build a page of 2,000 labels",lambda d: gen_labels(2000)),
+    "nested_divs":("build divs nested 100 deep",lambda d: gen_nested(100)),
+    "listbox":("build a scrollbox of 100,000 items (create_listbox)",lambda d: gen_listbox(100000)),
+    "scrollframe":("build a scrolling div of 2,000 rows (create_scrollframe)",lambda d: gen_scrollframe(2000)),
+    "gallery":("build 40 images from 1600x1200 JPEGs (TagUtility.get_image)",lambda d: gen_gallery(40,d)),
+    "form":("build a form of 500 text inputs",lambda d: gen_form(500)),
+    "navigation":("goto_link to the labels page, cold and then warm",lambda d: gen_labels(2000)),
+}
+
+
+def count_widgets(widget):
+    return 1+sum(count_widgets(child) for child in widget.winfo_children())
+
+def destroy_windows(keep=None):
+    """destroys every Window built so far with Window.destroy, so the images they acquired go back to IMAGE_CACHE and IMAGE_CACHE.clear() really empties it"""
+    import gui_engine
+    for window in list(gui_engine.Window._windows):
+        if window is not keep:
+            window.destroy()
+
+def run_scenario(name,repeat,parser,batched=False):
+    """runs one scenario in this process and returns its measurements"""
+    import tkinter as tk
+    import gui_engine
+
+    gui_engine.Window.batched = batched
+    workdir = tempfile.mkdtemp(prefix="gui_engine_bench_")
+    os.chdir(workdir)
+    os.makedirs("gui_pages")
+    gui_engine.TagUtility.set_parser(parser)
+    gui_engine.IMAGE_CACHE.cache_dir = False
+    with open(os.path.join("gui_pages","target.html"),"w") as file:
+        file.write(SCENARIOS[name][1](workdir))
+    with open(os.path.join("gui_pages","start.html"),"w") as file:
+        file.write(gen_link_page())
+
+    root = tk.Tk()
+    root.withdraw()
+    interp = root.tk
+    timings = []
+    tcl_commands = []
+    widgets = 0
+    try:
+        for _ in range(repeat):
+            gui_engine.PAGE_CACHE.invalidate()
+            gui_engine.IMAGE_CACHE.clear()
+            before = set(root.winfo_children())
+            commands = int(interp.call("info","cmdcount"))
+            start = time.perf_counter()
+            if name == "navigation":
+                window = gui_engine.Window(path=os.path.join("gui_pages","start.html"),master=root)
+                window.post()
+                root.update_idletasks()
+                """cold and warm are timed the same way, up to the end of the idle tasks the navigation queued"""
+                runs = []
+                for run in ("cold","warm"):
+                    if run == "warm":
+                        destroy_windows(keep=window)
+                    commands = int(interp.call("info","cmdcount"))
+                    start = time.perf_counter()
+                    window.goto_link("target.html")
+                    root.update_idletasks()
+                    runs.append((time.perf_counter()-start,int(interp.call("info","cmdcount"))-commands))
+                timings.append((runs[0][0],runs[1][0]))
+                tcl_commands.append((runs[0][1],runs[1][1]))
+            else:
+                window = gui_engine.Window(path=os.path.join("gui_pages","target.html"),master=root)
+                window.post()
+                root.update_idletasks()
+                timings.append(time.perf_counter()-start)
+                tcl_commands.append(int(interp.call("info","cmdcount"))-commands)
+            widgets = sum(count_widgets(child) for child in set(root.winfo_children())-before)
+            destroy_windows()
+            for child in set(root.winfo_children())-before:
+                child.destroy()
+            root.update()
+    finally:
+        root.destroy()
+        os.chdir(ROOT)
+        shutil.rmtree(workdir,ignore_errors=True)
+
+    if name == "navigation":
+        result = {"cold_ms":summarize([t[0] for t in timings]),"warm_ms":summarize([t[1] for t in timings]),\
+            "cold_tcl_commands":min(t[0] for t in tcl_commands),"warm_tcl_commands":min(t[1] for t in tcl_commands)}
+    else:
+        result = {"build_ms":summarize(timings),"tcl_commands":min(tcl_commands)}
+    result["widgets"] = widgets
+    """ru_maxrss is in KB on Linux"""
+    result["peak_rss_kb"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return result
+
+def summarize(seconds):
+    ms = [s*1000 for s in seconds]
+    return {"min":round(min(ms),3),"median":round(statistics.median(ms),3),"max":round(max(ms),3)}
+
+
+def ensure_display():
+    """starts an Xvfb server if there is no display, returns the process so it can be stopped afterwards"""
+    if os.environ.get("DISPLAY"):
+        return None
+    xvfb = shutil.which("Xvfb")
+    if xvfb is None:
+        sys.exit("no DISPLAY and no Xvfb found, install Xvfb or run the benchmarks under xvfb-run")
+    display = f":{os.getpid()%1000+100}"
+    process = subprocess.Popen([xvfb,display,"-screen","0","1920x1080x24","-nolisten","tcp"],stdout=subprocess.DEVNULL,stderr=subprocess.DEVNULL)
+    os.environ["DISPLAY"] = display
+    time.sleep(0.5)
+    return process
+
+def run_all(names,repeat,parser,batched=False):
+    """runs every scenario in a subprocess, so each one gets its own peak RSS"""
+    results = {}
+    for name in names:
+        output = subprocess.run([sys.executable,__file__,"--child",name,"--repeat",str(repeat),"--parser",parser]+(["--batched"] if batched else []),\
+            capture_output=True,text=True)
+        if output.returncode != 0:
+            results[name] = {"error":output.stderr.strip().splitlines()[-1] if output.stderr.strip() else "failed"}
+        else:
+            results[name] = json.loads(output.stdout.strip().splitlines()[-1])
+        print(f"{name}: {json.dumps(results[name])}",file=sys.stderr)
+    return results
+
+def metadata(parser,repeat,batched):
+    import tkinter as tk
+    try:
+        commit = subprocess.run(["git","rev-parse","--short","HEAD"],cwd=ROOT,capture_output=True,text=True).stdout.strip()
+    except OSError:
+        commit = ""
+    return {
+        "timestamp":time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "commit":commit,
+        "python":platform.python_version(),
+        "tk":str(tk.TkVersion),
+        "platform":platform.platform(),
+        "parser":parser,
+        "batched":batched,
+        "repeat":repeat,
+    }
+
+
+"""metric -> how to pull a comparable number out of a scenario result"""
+METRICS = {
+    "build_ms":lambda r: r["build_ms"]["median"],
+    "cold_ms":lambda r: r["cold_ms"]["median"],
+    "warm_ms":lambda r: r["warm_ms"]["median"],
+    "tcl_commands":lambda r: r["tcl_commands"],
+    "cold_tcl_commands":lambda r: r["cold_tcl_commands"],
+    "warm_tcl_commands":lambda r: r["warm_tcl_commands"],
+    "peak_rss_kb":lambda r: r["peak_rss_kb"],
+}
+
+def compare(old,new,threshold):
+    """prints old vs new for every metric and returns the metrics that got worse by more than threshold"""
+    regressions = []
+    print(f"{'scenario':<14}{'metric':<18}{'old':>14}{'new':>14}{'change':>10}")
+    for name,result in new["results"].items():
+        previous = old["results"].get(name)
+        if previous is None or "error" in result or "error" in previous:
+            continue
+        for metric,get in METRICS.items():
+            if metric not in result or metric not in previous:
+                continue
+            before,after = get(previous),get(result)
+            change = (after-before)/before if before else 0.0
+            flag = " !" if change > threshold else ""
+            print(f"{name:<14}{metric:<18}{before:>14}{after:>14}{change:>+9.1%}{flag}")
+            if change > threshold:
+                regressions.append((name,metric,change))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Headless benchmarks for gui_engine")
+    parser.add_argument("--scenario",action="append",choices=list(SCENARIOS),help="scenario to run, can be given more than once (default: all)")
+    parser.add_argument("--repeat",type=int,default=5,help="times to run each scenario")
+    parser.add_argument("--parser",default="lxml",help="TagUtility parser backend to use")
+    parser.add_argument("--batched",action="store_true",help="build pages with Window.batched")
+    parser.add_argument("-o","--output",help="file to write the JSON results to")
+    parser.add_argument("--compare",help="JSON results from an earlier run to compare against")
+    parser.add_argument("--threshold",type=float,default=0.10,help="relative slowdown that counts as a regression")
+    parser.add_argument("--child",help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(run_scenario(args.child,args.repeat,args.parser,args.batched)))
+        return 0
+
+    xvfb = ensure_display()
+    try:
+        results = {"meta":metadata(args.parser,args.repeat,args.batched),\
+            "results":run_all(args.scenario or list(SCENARIOS),args.repeat,args.parser,args.batched)}
+    finally:
+        if xvfb is not None:
+            xvfb.terminate()
+
+    text = json.dumps(results,indent=2)
+    if args.output:
+        with open(args.output,"w") as file:
+            file.write(text)
+    else:
+        print(text)
+
+    if args.compare:
+        with open(args.compare) as file:
+            regressions = compare(json.load(file),results,args.threshold)
+        if regressions:
+            print(f"{len(regressions)} regression(s) over {args.threshold:.0%}",file=sys.stderr)
+            return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
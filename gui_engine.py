@@ -1,17 +1,26 @@
 """
 gui_engine.py
 Written by Jasper Edbrooke
-gui_engine.py contains the Form, Window, TagUtility, Button, and Field classes.
+gui_engine.py contains the Form, Window, TagUtility, LiteTag, LiteParser, PageCompiler, PageCache, ImageCache, Prefetcher, Navigator, BuildProfiler, VirtualListbox, ListProvider, VirtualScrollFrame, LogView, Repeat, Node, WidgetRegistry, TkToolkit, HeadlessToolkit, LayoutWidget, LayoutScheduler, ActionRunner, ImageLoader, Button, and Field classes.
 """
 
-from bs4 import BeautifulSoup as bs
 import tkinter as tk
 from tkinter import Canvas
 from tkinter import messagebox as tkmb
-from PIL import ImageTk,Image
+from html.parser import HTMLParser
 import os
+import time
+import threading
+import weakref
+import queue
+import hashlib
+import bisect
+import re
+from collections import OrderedDict, deque
 from io import BytesIO
 
+"""bs4, lxml and PIL are only imported when a page actually needs them, so they don't slow down starting the GUI"""
+
 
 
 class TagUtility():
@@ -40,6 +49,14 @@ class TagUtility():
         "btype":str,
         "title":str,
         "args":str,
+        "run":str,
+    }
+
+    """Possible Arguments for logview and streaming textarea tags"""
+    LOGVIEW_ARGS = {
+        "height":int,
+        "width":int,
+        "maxlines":int,
     }
 
     """Possible Arguments for div (tk.frame) tag"""
@@ -54,14 +71,44 @@ class TagUtility():
         "listbox":LISTBOX_ARGS,
         "button":BUTTON_ARGS,
         "frame":FRAME_ARGS,
+        "logview":LOGVIEW_ARGS,
     }
 
-    """gets the HTML from a file and returns a Beautiful Soup obejct for parsing"""
+    """The parser backend get_html uses, one of the keys of PARSERS"""
+    parser = "lxml"
+
+    """gets the HTML from a file and returns a Beautiful Soup obejct for parsing, or a LiteTag tree with the "lite" parser"""
     @staticmethod
-    def get_html(path):
-        file = open(path)
-        soup = bs(file,"lxml")
-        return soup
+    def get_html(path,parser=None):
+        with open(path) as file:
+            return PARSERS[parser if parser else TagUtility.parser](file)
+
+    """sets the parser backend get_html uses for every page"""
+    @staticmethod
+    def set_parser(parser):
+        if parser not in PARSERS:
+            raise ValueError(f"unknown parser {parser}, expected one of {list(PARSERS)}")
+        TagUtility.parser = parser
+
+    """gets the parsed page for a path from the process wide page cache, only parsing the file if it is new or has changed"""
+    @staticmethod
+    def get_cached_html(path):
+        return PAGE_CACHE.get(path)
+
+    """checks if two tags, and everything inside them, are the same"""
+    @staticmethod
+    def same_tag(a,b):
+        if a is b:
+            return True
+        if a.name != b.name:
+            return False
+        if a.name is None:
+            return str(a).strip() == str(b).strip()
+        if a.attrs != b.attrs:
+            return False
+        a_children = [child for child in a if child.name is not None or str(child).strip()]
+        b_children = [child for child in b if child.name is not None or str(child).strip()]
+        return len(a_children) == len(b_children) and all(TagUtility.same_tag(x,y) for x,y in zip(a_children,b_children))
 
     """casting function to cast "true" and "false" to bools"""
     @staticmethod
@@ -79,8 +126,11 @@ class TagUtility():
             return None
 
     """returns all the relevant arguments for a given tag and type"""
+    """tags from a compiled page carry their arguments already cast, so they are just copied"""
     @staticmethod
     def get_element_args(tag,element):
+        if isinstance(tag,LiteTag) and tag.element_args is not None:
+            return dict(tag.element_args.get(element,()))
         return dict(\
             [(arg,TagUtility.get_attribute(tag,arg,kind))\
             for arg,kind in TagUtility.ELEMENT_ARGS[element].items()\
@@ -101,6 +151,11 @@ class TagUtility():
     def get_button_args(tag):
         return TagUtility.get_element_args(tag,"button")
 
+    """returns all the tags related to the logview tag"""
+    @staticmethod
+    def get_logview_args(tag):
+        return TagUtility.get_element_args(tag,"logview")
+
     """returns all the tags related to the div (tk.frame) tag"""
     @staticmethod
     def get_frame_args(tag):
@@ -109,7 +164,48 @@ class TagUtility():
     """returns an image in a format that tkinter can use"""
     """not really related to tags, but still a utility function"""
     @staticmethod
-    def get_image(src,target_size=250,mode='path'):
+    def get_image(src,target_size=250,mode='path',cache=True):
+        if PROFILER is not None:
+            with PROFILER.span("image",src if mode == "path" else "blob",target_size):
+                return TagUtility._get_image(src,target_size,mode,cache)
+        return TagUtility._get_image(src,target_size,mode,cache)
+
+    @staticmethod
+    def _get_image(src,target_size,mode,cache):
+        if cache:
+            return IMAGE_CACHE.get(src,target_size,mode)
+        from PIL import ImageTk
+        return ImageTk.PhotoImage(TagUtility.resize_image(src,target_size,mode))
+
+    """characters that need a backslash in a Tcl word, and the escapes for the whitespace ones"""
+    TCL_SPECIAL = set('\\[]{}"$; ')
+    TCL_ESCAPES = {"\n":"\\n","\t":"\\t","\r":"\\r","\v":"\\v","\f":"\\f"}
+
+    """quotes a value as a single Tcl word, for building Tcl scripts"""
+    """not really related to tags, but still a utility function"""
+    @staticmethod
+    def tcl_quote(value):
+        value = str(value)
+        if not value:
+            return "{}"
+        return "".join(TagUtility.TCL_ESCAPES.get(c,"\\"+c if c in TagUtility.TCL_SPECIAL else c) for c in value)
+
+    """returns the (width,height) resize_image will give the image, only the image header is read so it is cheap enough for the tkinter thread"""
+    @staticmethod
+    def image_size(src,target_size=250,mode='path'):
+        from PIL import Image
+        try:
+            with Image.open(src if mode == "path" else BytesIO(src)) as img_pil:
+                width,height = img_pil.size
+        except (OSError,ValueError):
+            return (target_size,target_size)
+        return (target_size,int(target_size/(width/height)))
+
+    """opens an image and resizes it to target_size wide, returns the PIL image"""
+    """JPEGs are decoded in draft mode so big photos get decoded at a reduced scale instead of full resolution"""
+    @staticmethod
+    def resize_image(src,target_size=250,mode='path'):
+        from PIL import Image
         if mode == "path": 
             img_pil = Image.open(src)
         elif mode == 'blob':
@@ -118,41 +214,1718 @@ class TagUtility():
         ratio = width/height
         width_new = target_size
         height_new = target_size/ratio
-        img_pil = img_pil.resize((int(width_new), int(height_new)), Image.ANTIALIAS)
-        return ImageTk.PhotoImage(img_pil)
+        if img_pil.format == "JPEG":
+            img_pil.draft("RGB",(int(width_new),int(height_new)))
+        img_pil = img_pil.resize((int(width_new), int(height_new)), Image.LANCZOS)
+        return img_pil
+
+class LiteString(str):
+    """a string inside a LiteTag, it has a name of None like the strings in a Beautiful Soup tree"""
+    name = None
+
+class LiteTag():
+    """LiteTag is a compact tag tree node with the parts of the Beautiful Soup Tag interface that Window uses"""
+    """Iterating gives the children (tags and LiteStrings), tag[attr] gives attributes, and text and find_all work like they do in bs4"""
+    """element_args is set on the tags of compiled pages, element -> the arguments TagUtility.get_element_args would give"""
+    __slots__ = ("name","attrs","contents","parent","element_args")
+
+    def __init__(self,name,attrs=None,parent=None):
+        self.name = name
+        self.attrs = attrs if attrs is not None else {}
+        self.contents = []
+        self.parent = parent
+        self.element_args = None
+
+    @staticmethod
+    def child(parent,name,attrs,element_args=None):
+        """adds a new tag to the end of parent and returns it, compiled pages are built with this"""
+        tag = LiteTag(name,attrs,parent)
+        tag.element_args = element_args
+        parent.contents.append(tag)
+        return tag
+
+    @staticmethod
+    def string(parent,text):
+        parent.contents.append(LiteString(text))
+
+    def __iter__(self):
+        return iter(self.contents)
+
+    def __getitem__(self,attr):
+        return self.attrs[attr]
+
+    def get(self,attr,default=None):
+        return self.attrs.get(attr,default)
+
+    def has_attr(self,attr):
+        return attr in self.attrs
+
+    @property
+    def text(self):
+        return "".join(self._strings())
+
+    def _strings(self):
+        for child in self.contents:
+            if child.name is None:
+                yield child
+            else:
+                yield from child._strings()
+
+    def descendants(self):
+        """yields every tag inside this one, in document order"""
+        stack = [iter(self.contents)]
+        while stack:
+            child = next(stack[-1],None)
+            if child is None:
+                stack.pop()
+            elif child.name is not None:
+                yield child
+                stack.append(iter(child.contents))
+
+    def find_all(self,name=None):
+        return [tag for tag in self.descendants() if name is None or tag.name == name]
+
+    def find(self,name):
+        for tag in self.descendants():
+            if tag.name == name:
+                return tag
+        return None
+
+    @property
+    def head(self):
+        return self.find("head")
+
+    @property
+    def body(self):
+        return self.find("body")
+
+    def __str__(self):
+        attrs = "".join(f' {k}="{v}"' for k,v in self.attrs.items())
+        if self.name in LiteParser.VOID_TAGS:
+            return f"<{self.name}{attrs}/>"
+        return f"<{self.name}{attrs}>{''.join(str(child) for child in self.contents)}</{self.name}>"
+
+    def __repr__(self):
+        return str(self)
+
+class LiteParser(HTMLParser):
+    """LiteParser is a streaming parser built on the standard library's html.parser, it builds a LiteTag tree"""
+    """It is much lighter than Beautiful Soup, but it doesn't fix up broken HTML the way lxml does"""
+    VOID_TAGS = {"img","input","br","hr","meta","link","area","base","col","embed","param","source","track","wbr"}
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.root = LiteTag("[document]")
+        self.stack = [self.root]
+
+    def handle_starttag(self,name,attrs):
+        tag = self._add_tag(name,attrs)
+        if name not in LiteParser.VOID_TAGS:
+            self.stack.append(tag)
+
+    def handle_startendtag(self,name,attrs):
+        self._add_tag(name,attrs)
+
+    def _add_tag(self,name,attrs):
+        parent = self.stack[-1]
+        tag = LiteTag(name,{k:(v if v is not None else "") for k,v in attrs},parent)
+        parent.contents.append(tag)
+        return tag
+
+    def handle_endtag(self,name):
+        """close the most recent open tag with this name, and anything left open inside it"""
+        for i in range(len(self.stack)-1,0,-1):
+            if self.stack[i].name == name:
+                del self.stack[i:]
+                return
+
+    def handle_data(self,data):
+        self.stack[-1].contents.append(LiteString(data))
+
+    @staticmethod
+    def parse(file,chunk_size=65536):
+        """parses a file object into a LiteTag tree, making sure there is a head and a body like lxml does"""
+        parser = LiteParser()
+        for chunk in iter(lambda: file.read(chunk_size),""):
+            parser.feed(chunk)
+        parser.close()
+        root = parser.root
+        html = root.find("html") or root
+        if html.find("head") is None:
+            html.contents.insert(0,LiteTag("head",parent=html))
+        if html.find("body") is None:
+            body = LiteTag("body",parent=html)
+            body.contents = [child for child in html.contents if child.name != "head"]
+            for child in body.contents:
+                if child.name is not None:
+                    child.parent = body
+            html.contents = [child for child in html.contents if child.name == "head"]+[body]
+        return root
+
+class PageCompiler():
+    """PageCompiler turns HTML pages into Python modules that rebuild their LiteTag trees with straight line code"""
+    """The attributes TagUtility.get_element_args casts are cast once, when compiling, and stored on the tags"""
+    """A compiled page is used instead of parsing the HTML as long as the HTML isn't newer than it, so shipped apps don't need bs4 or lxml at runtime"""
+    """Compiled pages go in a __compiled__ directory next to the pages, gui_pages/start.html compiles to gui_pages/__compiled__/start.py"""
+    directory = "__compiled__"
+    """set enabled to False to always parse the HTML"""
+    enabled = True
+    """bumped when the compiled modules change, so ones written by an older version are stale"""
+    version = 3
+
+    @staticmethod
+    def compiled_path(path):
+        head,tail = os.path.split(os.path.abspath(path))
+        return os.path.join(head,PageCompiler.directory,os.path.splitext(tail)[0]+".py")
+
+    @staticmethod
+    def signature():
+        """the module version and the argument tables the compiled arguments came from, a compiled page made with different ones is stale"""
+        return repr((PageCompiler.version,{element:{arg:kind.__name__ for arg,kind in args.items()} for element,args in TagUtility.ELEMENT_ARGS.items()}))
+
+    @staticmethod
+    def compile_page(path,parser=None):
+        """parses the page and returns the source of its compiled module"""
+        soup = TagUtility.get_html(path,parser)
+        lines = [
+            '"""',
+            f"Compiled from {os.path.basename(path)} by gui_engine's PageCompiler, do not edit",
+            '"""',
+            "",
+            f"SIGNATURE = {PageCompiler.signature()!r}",
+            "",
+            "def build(T):",
+            "    n = T.child",
+            "    s = T.string",
+            "    E = {}",
+            "    t0 = T('[document]')",
+        ]
+        PageCompiler._emit(soup,0,lines)
+        lines.append("    return t0")
+        return "\n".join(lines)+"\n"
+
+    @staticmethod
+    def _emit(tag,depth,lines):
+        """every tag becomes one statement, the tag at each depth is kept in t<depth> while its children are added"""
+        has_tags = any(child.name is not None for child in tag)
+        for child in tag:
+            if child.name is None:
+                if not PageCompiler._is_text(child):
+                    continue
+                text = str(child)
+                """whitespace between tags is never shown, text on its own might be"""
+                if has_tags and not text.strip():
+                    continue
+                lines.append(f"    s(t{depth},{text!r})")
+                continue
+            """Beautiful Soup gives multi valued attributes like class as lists"""
+            """every tag gets a dict of its own, since attrs can be changed after the page is built, the element args are only ever copied so tags without any share E"""
+            attrs = {k:" ".join(v) if isinstance(v,list) else v for k,v in child.attrs.items()}
+            args = {element:TagUtility.get_element_args(child,element) for element in TagUtility.ELEMENT_ARGS}
+            args = {element:value for element,value in args.items() if value}
+            lines.append(f"    t{depth+1} = n(t{depth},{child.name!r},{attrs!r},{repr(args) if args else 'E'})")
+            PageCompiler._emit(child,depth+1,lines)
+
+    @staticmethod
+    def _is_text(string):
+        """Beautiful Soup keeps comments, the doctype and processing instructions as strings too, they aren't text"""
+        try:
+            from bs4.element import CData, PreformattedString
+        except ImportError:
+            return True
+        return not isinstance(string,PreformattedString) or isinstance(string,CData)
+
+    @staticmethod
+    def compile_file(path,parser=None):
+        """compiles one page and writes its module, returns the module's path"""
+        out = PageCompiler.compiled_path(path)
+        source = PageCompiler.compile_page(path,parser)
+        os.makedirs(os.path.dirname(out),exist_ok=True)
+        tmp_path = f"{out}.{os.getpid()}.tmp"
+        with open(tmp_path,"w") as file:
+            file.write(source)
+        os.replace(tmp_path,out)
+        """the bytecode is written now, so loading the page never has to compile the module even where Python doesn't write .pyc files"""
+        import py_compile
+        py_compile.compile(out,doraise=True)
+        return out
+
+    @staticmethod
+    def compile_dir(pages_dir="gui_pages",parser=None):
+        """compiles every .html page under pages_dir, returns the paths of the modules"""
+        compiled = []
+        for root,dirs,files in os.walk(pages_dir):
+            dirs[:] = [d for d in dirs if d != PageCompiler.directory]
+            for name in sorted(files):
+                if name.endswith((".html",".htm")):
+                    compiled.append(PageCompiler.compile_file(os.path.join(root,name),parser))
+        return compiled
+
+    @staticmethod
+    def load(path):
+        """returns the LiteTag tree from the page's compiled module, or None if there isn't one that is up to date"""
+        if not PageCompiler.enabled:
+            return None
+        out = PageCompiler.compiled_path(path)
+        try:
+            if os.stat(out).st_mtime_ns < os.stat(path).st_mtime_ns:
+                return None
+        except OSError:
+            return None
+        import importlib.util
+        spec = importlib.util.spec_from_file_location("gui_engine_compiled_"+hashlib.sha1(out.encode()).hexdigest()[:16],out)
+        module = importlib.util.module_from_spec(spec)
+        try:
+            spec.loader.exec_module(module)
+        except Exception as e:
+            print(e)
+            return None
+        if getattr(module,"SIGNATURE",None) != PageCompiler.signature():
+            return None
+        return module.build(LiteTag)
+
+def _parse_bs4(features):
+    def parse(file):
+        from bs4 import BeautifulSoup
+        return BeautifulSoup(file,features)
+    return parse
+
+"""Parser backends for TagUtility.get_html, each one takes an open file and returns a tree with the Beautiful Soup Tag interface"""
+PARSERS = {
+    "lxml":_parse_bs4("lxml"),
+    "html.parser":_parse_bs4("html.parser"),
+    "lite":LiteParser.parse,
+}
+
+class PageCache():
+    """PageCache is a process wide LRU cache of parsed pages, so navigating to a page we have already seen skips the parse"""
+    """Entries are keyed by the absolute path and checked against the file's mtime and size, or a hash of its contents, so edited pages get re-parsed"""
+    """The cached soups are shared between every window that shows the page, so they must be treated as read only"""
+    def __init__(self,maxsize=64,hash_contents=False):
+        self.maxsize = maxsize
+        self.hash_contents = hash_contents
+        self.hits = 0
+        self.misses = 0
+        """path -> (signature,soup), ordered from least to most recently used"""
+        self._entries = OrderedDict()
+        self._lock = threading.RLock()
+        self._watcher = None
+        self._stop_watching = None
+        self._callbacks = []
+
+    def _signature(self,path):
+        """returns the value used to tell if a file has changed since it was parsed"""
+        if self.hash_contents:
+            with open(path,"rb") as file:
+                return hashlib.sha1(file.read()).hexdigest()
+        stat = os.stat(path)
+        return (stat.st_mtime_ns,stat.st_size)
+
+    def get(self,path):
+        """returns the soup for the page at path, parsing it only on a miss"""
+        key = os.path.abspath(path)
+        signature = self._signature(key)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == signature:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+        soup = self._parse(key)
+        self._store(key,signature,soup)
+        return soup
+
+    def _parse(self,key):
+        """uses the page's compiled module when there is an up to date one"""
+        soup = PageCompiler.load(key)
+        return soup if soup is not None else TagUtility.get_html(key)
+
+    def _store(self,key,signature,soup):
+        with self._lock:
+            self._entries[key] = (signature,soup)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def invalidate(self,path=None):
+        """drops one page from the cache, or every page if no path is given"""
+        with self._lock:
+            if path is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(os.path.abspath(path),None)
+
+    def stats(self):
+        """returns the hit and miss counters and the current size of the cache"""
+        with self._lock:
+            return {"hits":self.hits,"misses":self.misses,"size":len(self._entries),"maxsize":self.maxsize}
+
+    def watch(self,interval=1.0,callback=None):
+        """starts a background thread that re-parses cached pages when their files change"""
+        """callback(path) is called from the watcher thread, so it should not touch tkinter widgets directly"""
+        if callback is not None:
+            self._callbacks.append(callback)
+        if self._watcher is not None:
+            return
+        self._stop_watching = threading.Event()
+        self._watcher = threading.Thread(target=self._watch_loop,args=(interval,self._stop_watching),daemon=True)
+        self._watcher.start()
+
+    def unwatch(self):
+        """stops the watcher thread and forgets the reload callbacks"""
+        if self._watcher is not None:
+            self._stop_watching.set()
+            self._watcher = None
+        self._callbacks = []
+
+    def _watch_loop(self,interval,stop):
+        while not stop.wait(interval):
+            with self._lock:
+                entries = [(key,entry[0]) for key,entry in self._entries.items()]
+            for key,signature in entries:
+                try:
+                    current = self._signature(key)
+                except OSError:
+                    """the page was deleted, so just forget about it"""
+                    self.invalidate(key)
+                    continue
+                if current == signature:
+                    continue
+                try:
+                    self._store(key,current,self._parse(key))
+                except Exception as e:
+                    print(e)
+                    self.invalidate(key)
+                    continue
+                for callback in list(self._callbacks):
+                    callback(key)
+
+"""The page cache shared by every window in the process"""
+PAGE_CACHE = PageCache()
+
+class ImageCache():
+    """ImageCache keeps resized images so the same file is never decoded and resized twice"""
+    """There are two levels, an in memory LRU of PhotoImages and an on disk store of resized thumbnails that survives restarts"""
+    """Entries are keyed by the source (path, mtime and size, or a hash of the blob) and the target size"""
+    """Images can also be warmed from a worker thread, the decoded PIL images wait in a store capped at max_warm_bytes until they are needed"""
+    """Windows acquire() the images they show and release() them when they are destroyed, an image is held once however many windows use it"""
+    """and isn't evicted while it is in use, maxsize only bounds the images nobody is using (maxsize=0 frees them as soon as the last user releases them)"""
+    """The thumbnail store is capped at max_disk_bytes, when a save goes over it the least recently used thumbnails are deleted until it is back under 3/4 of the cap"""
+    def __init__(self,maxsize=256,cache_dir=None,max_warm_bytes=32*1024*1024,max_disk_bytes=256*1024*1024):
+        self.maxsize = maxsize
+        self.max_warm_bytes = max_warm_bytes
+        """max_disk_bytes=None lets the thumbnail store grow without a limit"""
+        self.max_disk_bytes = max_disk_bytes
+        """the size of the thumbnail store, counted the first time something is saved to it"""
+        self._disk_bytes = None
+        """cache_dir=False turns off the on disk store"""
+        if cache_dir is None:
+            cache_dir = os.path.join(os.path.expanduser("~"),".cache","gui_engine","thumbnails")
+        self.cache_dir = cache_dir
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.warm_hits = 0
+        """key -> PhotoImage for the images nobody is using, ordered from least to most recently used"""
+        self._photos = OrderedDict()
+        """key -> [PhotoImage,reference count] for the images windows are using"""
+        self._in_use = {}
+        """key -> (PIL image,size in bytes) for warmed images that haven't been turned into PhotoImages yet"""
+        self._warm = OrderedDict()
+        self._warm_bytes = 0
+        self._lock = threading.RLock()
+
+    def _key(self,src,target_size,mode):
+        if mode == "blob":
+            return ("blob",hashlib.sha1(src).hexdigest(),target_size)
+        path = os.path.abspath(src)
+        stat = os.stat(path)
+        return ("path",path,stat.st_mtime_ns,stat.st_size,target_size)
+
+    def _disk_path(self,key):
+        return os.path.join(self.cache_dir,hashlib.sha1(repr(key).encode()).hexdigest()+".png")
+
+    def load(self,src,target_size=250,mode='path'):
+        """returns the resized PIL image, reading it from the thumbnail store if it was resized before"""
+        """this doesn't touch tkinter, so it is safe to call from worker threads"""
+        return self._load(self._key(src,target_size,mode),src,target_size,mode)
+
+    def _load(self,key,src,target_size,mode):
+        if self.cache_dir:
+            disk_path = self._disk_path(key)
+            if os.path.isfile(disk_path):
+                try:
+                    from PIL import Image
+                    img_pil = Image.open(disk_path)
+                    img_pil.load()
+                    with self._lock:
+                        self.disk_hits += 1
+                except OSError:
+                    pass
+                else:
+                    """a hit makes the thumbnail the most recently used one, so pruning deletes it last"""
+                    try:
+                        os.utime(disk_path)
+                    except OSError:
+                        pass
+                    return img_pil
+        with self._lock:
+            self.misses += 1
+        img_pil = TagUtility.resize_image(src,target_size,mode)
+        if self.cache_dir:
+            self._save(disk_path,img_pil)
+        return img_pil
+
+    def _save(self,disk_path,img_pil):
+        """writes the thumbnail to a temporary file first so other processes never see a half written one"""
+        try:
+            os.makedirs(self.cache_dir,exist_ok=True)
+            tmp_path = f"{disk_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            img_pil.save(tmp_path,"PNG")
+            os.replace(tmp_path,disk_path)
+            size = os.path.getsize(disk_path)
+        except OSError as e:
+            print(e)
+            return
+        if self.max_disk_bytes is None:
+            return
+        with self._lock:
+            if self._disk_bytes is None:
+                self._disk_bytes = sum(entry[1] for entry in self._disk_entries())
+            else:
+                self._disk_bytes += size
+            if self._disk_bytes <= self.max_disk_bytes:
+                return
+        self.prune_disk(self.max_disk_bytes*3//4)
+
+    def _disk_entries(self):
+        """returns (mtime,size,path) for every thumbnail in the store"""
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            if name.endswith(".png"):
+                path = os.path.join(self.cache_dir,name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime_ns,stat.st_size,path))
+        return entries
+
+    def prune_disk(self,max_bytes):
+        """deletes the least recently used thumbnails until the store is no bigger than max_bytes, returns how many were deleted"""
+        if not self.cache_dir or not os.path.isdir(self.cache_dir):
+            return 0
+        entries = sorted(self._disk_entries())
+        total = sum(entry[1] for entry in entries)
+        removed = 0
+        for mtime,size,path in entries:
+            if total <= max_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+            removed += 1
+        with self._lock:
+            self._disk_bytes = total
+        return removed
+
+    def get(self,src,target_size=250,mode='path'):
+        """returns a PhotoImage for the source at the target size, must be called from the tkinter thread"""
+        return self._get(self._key(src,target_size,mode),src,target_size,mode,False)
+
+    def acquire(self,src,target_size=250,mode='path'):
+        """like get(), but the image is held for the caller until it calls release(key), returns (key,PhotoImage)"""
+        key = self._key(src,target_size,mode)
+        return key,self._get(key,src,target_size,mode,True)
+
+    def release(self,key):
+        """gives back an image from acquire(), once the last user releases it it becomes evictable"""
+        with self._lock:
+            entry = self._in_use.get(key)
+            if entry is None:
+                return
+            entry[1] -= 1
+            if entry[1] <= 0:
+                del self._in_use[key]
+                self._photos[key] = entry[0]
+                self._evict()
+
+    def _get(self,key,src,target_size,mode,acquire):
+        with self._lock:
+            photo = self._lookup(key,acquire)
+            if photo is not None:
+                self.hits += 1
+                return photo
+            warm = self._warm.pop(key,None)
+            if warm is not None:
+                self._warm_bytes -= warm[1]
+                self.warm_hits += 1
+        img_pil = warm[0] if warm is not None else self._load(key,src,target_size,mode)
+        return self._insert(key,img_pil,acquire)
+
+    def acquire_cached(self,src,target_size=250,mode='path'):
+        """like acquire(), but only if the PhotoImage is already in memory, returns (key,None) otherwise so the image can be load()ed elsewhere"""
+        key = self._key(src,target_size,mode)
+        with self._lock:
+            photo = self._lookup(key,True)
+            if photo is not None:
+                self.hits += 1
+                return key,photo
+            warm = self._warm.pop(key,None)
+            if warm is None:
+                return key,None
+            self._warm_bytes -= warm[1]
+            self.warm_hits += 1
+        return key,self._insert(key,warm[0],True)
+
+    def acquire_loaded(self,key,img_pil):
+        """turns a PIL image from load() into a held PhotoImage, must be called from the tkinter thread"""
+        return self._insert(key,img_pil,True)
+
+    def _insert(self,key,img_pil,acquire):
+        with self._lock:
+            """another caller may have made the same image while this one was loading"""
+            existing = self._lookup(key,acquire)
+            if existing is not None:
+                return existing
+        """PhotoImages are only made on the tkinter thread, so nothing can add this one between the lookup and storing it"""
+        from PIL import ImageTk
+        photo = ImageTk.PhotoImage(img_pil)
+        with self._lock:
+            if acquire:
+                self._in_use[key] = [photo,1]
+            else:
+                self._photos[key] = photo
+                self._evict()
+        return photo
+
+    def _lookup(self,key,acquire):
+        entry = self._in_use.get(key)
+        if entry is not None:
+            if acquire:
+                entry[1] += 1
+            return entry[0]
+        photo = self._photos.get(key)
+        if photo is not None:
+            if acquire:
+                del self._photos[key]
+                self._in_use[key] = [photo,1]
+            else:
+                self._photos.move_to_end(key)
+        return photo
+
+    def _evict(self):
+        while len(self._photos) > self.maxsize:
+            self._photos.popitem(last=False)
+
+    def warm(self,src,target_size=250,mode='path',max_bytes=None):
+        """decodes and resizes an image ahead of time so get() only has to make the PhotoImage, safe to call from worker threads"""
+        """max_bytes caps the warmed images for this call instead of max_warm_bytes"""
+        key = self._key(src,target_size,mode)
+        with self._lock:
+            if key in self._photos or key in self._in_use or key in self._warm:
+                return
+        img_pil = self._load(key,src,target_size,mode)
+        size = img_pil.width*img_pil.height*len(img_pil.getbands())
+        with self._lock:
+            self._warm[key] = (img_pil,size)
+            self._warm_bytes += size
+            max_bytes = self.max_warm_bytes if max_bytes is None else max_bytes
+            while self._warm_bytes > max_bytes and self._warm:
+                self._warm_bytes -= self._warm.popitem(last=False)[1][1]
+
+    def clear(self,disk=False):
+        """drops the in memory images, and the thumbnail store too if disk is True"""
+        with self._lock:
+            self._photos.clear()
+            self._warm.clear()
+            self._warm_bytes = 0
+        if disk and self.cache_dir and os.path.isdir(self.cache_dir):
+            for name in os.listdir(self.cache_dir):
+                if name.endswith(".png"):
+                    os.remove(os.path.join(self.cache_dir,name))
+            with self._lock:
+                self._disk_bytes = 0
+
+    def stats(self):
+        """returns the memory hit, disk hit and miss counters and the current size of the cache"""
+        with self._lock:
+            return {"hits":self.hits,"disk_hits":self.disk_hits,"warm_hits":self.warm_hits,"misses":self.misses,\
+                "size":len(self._photos)+len(self._in_use),"in_use":len(self._in_use),"maxsize":self.maxsize,"warm_bytes":self._warm_bytes}
+
+"""The image cache shared by every window in the process"""
+IMAGE_CACHE = ImageCache()
+
+class Prefetcher():
+    """Prefetcher parses the pages a window links to, and decodes their images, on background threads while the user looks at the current page"""
+    """Pages go into the PAGE_CACHE and images are warmed in the IMAGE_CACHE, so following a link only has to create the widgets"""
+    """Starting a new prefetch, or navigating, cancels whatever the last one hadn't got to yet"""
+    def __init__(self,max_workers=2,max_pages=16,max_bytes=None,pages_dir="gui_pages"):
+        from concurrent.futures import ThreadPoolExecutor
+        self.executor = ThreadPoolExecutor(max_workers=max_workers,thread_name_prefix="gui_engine_prefetch")
+        self.max_pages = max_pages
+        self.pages_dir = pages_dir
+        """max_bytes caps the memory used by decoded images waiting to be shown, None leaves it to IMAGE_CACHE.max_warm_bytes"""
+        self.max_bytes = max_bytes
+        self._futures = []
+        self._generation = 0
+
+    def prefetch(self,links):
+        """cancels the last prefetch and starts prefetching the pages for the given links"""
+        self.cancel()
+        generation = self._generation
+        for link in list(dict.fromkeys(links))[:self.max_pages]:
+            path = os.path.join(self.pages_dir,link)
+            self._futures.append(self.executor.submit(self._prefetch_page,path,generation))
+
+    def cancel(self):
+        """cancels the pages that haven't started yet, and makes the ones that have stop at their next step"""
+        self._generation += 1
+        for future in self._futures:
+            future.cancel()
+        self._futures = []
+
+    def shutdown(self):
+        self.cancel()
+        self.executor.shutdown(wait=False)
+
+    def _prefetch_page(self,path,generation):
+        if generation != self._generation or not os.path.isfile(path):
+            return
+        soup = PAGE_CACHE.get(path)
+        """button icons are shown at 20px and everything else at 250px, the same as Window does"""
+        icons = set(id(img) for button in soup.find_all("button") for img in button.find_all("img")[:1])
+        for img in soup.find_all("img"):
+            if generation != self._generation:
+                return
+            src = TagUtility.get_attribute(img,"src")
+            if not src or TagUtility.get_attribute(img,"mode") == "blob":
+                continue
+            try:
+                IMAGE_CACHE.warm(src,20 if id(img) in icons else 250,max_bytes=self.max_bytes)
+            except Exception as e:
+                print(e)
+
+class _NavEntry():
+    """a page in a Navigator's history, the link it was opened with and its Window while it is alive"""
+    def __init__(self,link,path,args,kwargs,window,opener=None):
+        self.link = link
+        self.path = path
+        self.args = args
+        self.kwargs = kwargs
+        self.window = window
+        """the Window the link was followed from, its windows mapping is used to rebuild the page if it gets evicted"""
+        self.opener = opener
+        """the widgets and image bytes the page held when it was hidden"""
+        self.widgets = 0
+        self.bytes = 0
+
+    def key(self):
+        key = (self.link,self.args,tuple(sorted(self.kwargs.items())))
+        try:
+            hash(key)
+        except TypeError:
+            """pages opened with unhashable arguments aren't shared between history entries"""
+            return id(self)
+        return key
+
+class Navigator():
+    """Navigator keeps the pages the user has visited alive instead of destroying them, so going back and forward is instant and keeps their Form state"""
+    """Only the current page's Toplevel is shown, the others are withdrawn, the root window stays alive the whole time"""
+    """Hidden pages are evicted least recently used first once there are more than max_pages of them, or they hold more than max_widgets widgets or max_bytes of images"""
+    def __init__(self,root,max_pages=8,max_widgets=20000,max_bytes=64*1024*1024):
+        self.root = root
+        self.max_pages = max_pages
+        self.max_widgets = max_widgets
+        self.max_bytes = max_bytes
+        self.current = _NavEntry(None,None,(),{},root)
+        self.back_stack = []
+        self.forward_stack = []
+        """page key -> entry for the hidden live pages, ordered from least to most recently used"""
+        self.hidden = OrderedDict()
+        self.evictions = 0
+
+    def goto(self,source,link,path,*args,**kwargs):
+        """shows the page for a link, reusing it if it is still alive"""
+        entry = _NavEntry(link,path,args,kwargs,None,source)
+        self.back_stack.append(self.current)
+        self.forward_stack = []
+        self._switch(entry)
+
+    def back(self):
+        """shows the previous page, returns False if there isn't one"""
+        if not self.back_stack:
+            return False
+        self.forward_stack.append(self.current)
+        self._switch(self.back_stack.pop())
+        return True
+
+    def forward(self):
+        """shows the next page after going back, returns False if there isn't one"""
+        if not self.forward_stack:
+            return False
+        self.back_stack.append(self.current)
+        self._switch(self.forward_stack.pop())
+        return True
+
+    def _switch(self,entry):
+        previous = self.current
+        self._hide(previous)
+        cached = self.hidden.pop(entry.key(),None)
+        if cached is not None and cached.window is not None and not cached.window.destroyed:
+            entry.window = cached.window
+        if entry.window is None or entry.window.destroyed:
+            entry.window = self._open(entry)
+        else:
+            self._show(entry)
+        self.current = entry
+        self._evict()
+
+    def _open(self,entry):
+        opener = entry.opener if entry.opener is not None and not entry.opener.destroyed else self.root
+        window = opener.open_page(entry.link,entry.path,self.root.win,*entry.args,**entry.kwargs)
+        """a transient window is withdrawn along with its master, and its master is hidden while it is shown"""
+        window.win.transient("")
+        return window
+
+    def _show(self,entry):
+        window = entry.window
+        if entry.path is not None:
+            soup = TagUtility.get_cached_html(entry.path)
+            if soup is not window.soup:
+                """the page changed while it was hidden"""
+                window.update_from(soup)
+        window.win.deiconify()
+        window.win.lift()
+        if window is not self.root:
+            window.win.grab_set()
+        window.win.focus_set()
+
+    def _hide(self,entry):
+        window = entry.window
+        if window is None or window.destroyed:
+            return
+        if window is not self.root:
+            window.win.grab_release()
+        window.win.withdraw()
+        if window is self.root:
+            return
+        entry.widgets,entry.bytes = self.weigh(window)
+        key = entry.key()
+        if key in self.hidden and self.hidden[key].window is not window:
+            self._drop(self.hidden.pop(key))
+        self.hidden[key] = entry
+        self.hidden.move_to_end(key)
+
+    def weigh(self,window):
+        """returns the (widgets,image bytes) a page holds, what max_widgets and max_bytes are measured in"""
+        return window._count_nodes(window.root_node),sum(img.width()*img.height()*4 for img in window.images)
+
+    def _evict(self):
+        while self.hidden and (len(self.hidden) > self.max_pages\
+         or sum(e.widgets for e in self.hidden.values()) > self.max_widgets\
+         or sum(e.bytes for e in self.hidden.values()) > self.max_bytes):
+            self._drop(self.hidden.popitem(last=False)[1])
+
+    def _drop(self,entry):
+        """destroys a hidden page, its history entries will rebuild it if they are visited again"""
+        if entry.window is not None and entry.window is not self.current.window:
+            entry.window.destroy()
+            self.evictions += 1
+        entry.window = None
+
+    def clear(self):
+        """destroys every hidden page and forgets the history"""
+        for entry in list(self.hidden.values()):
+            self._drop(entry)
+        self.hidden.clear()
+        self.back_stack = []
+        self.forward_stack = []
+
+    def stats(self):
+        """returns how many pages are hidden, what they hold, the history lengths and how many pages have been evicted"""
+        entries = list(self.hidden.values())
+        return {"hidden":len(entries),"widgets":sum(e.widgets for e in entries),"bytes":sum(e.bytes for e in entries),\
+            "back":len(self.back_stack),"forward":len(self.forward_stack),"evictions":self.evictions}
 
 class Button():
     """Button Base class, holds attribute for the button such as type and link and parent"""
     """Other windows will have their own derived versions of Button to hold the callback functions they will need"""
-    def __init__(self, link=None, action=None, btype=None, title=None, window=None,args=None):
+    def __init__(self, link=None, action=None, btype=None, title=None, window=None,args=None,run=None):
         self.link = link
         self.action = action
         self.btype = btype
         self.title = title
         self.window = window
         self.args = args
+        """run="background" runs the action in the ActionRunner instead of on the tkinter thread"""
+        self.run = run
+        """the tk.Button this Button belongs to, and the Future of its action while it runs in the background"""
+        self.widget = None
+        self.future = None
         if link and not btype:
             self.btype = "link"
         elif action and not btype:
             self.btype = "action"
 
+def run_in_background(method):
+    """decorator for Button action methods that should run in the ActionRunner instead of on the tkinter thread"""
+    method.run_in_background = True
+    return method
+
+class ActionRunner():
+    """ActionRunner runs slow actions off the tkinter thread and hands the results back to it"""
+    """Plain functions run in a thread pool and coroutines run on a background asyncio event loop, both are shared by every window"""
+    """Results come back through a thread safe queue that is only polled while something is running, backing off from min_interval to max_interval ms"""
+    _executor = None
+    _loop = None
+    _lock = threading.Lock()
+
+    def __init__(self,widget,max_workers=4,min_interval=10,max_interval=100):
+        self.widget = widget
+        self.max_workers = max_workers
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        """future -> (on_done,on_error) for everything that is running"""
+        self.running = {}
+        self.results = queue.SimpleQueue()
+        self._poll_id = None
+        self._interval = min_interval
+
+    def _get_executor(self):
+        from concurrent.futures import ThreadPoolExecutor
+        with ActionRunner._lock:
+            if ActionRunner._executor is None:
+                ActionRunner._executor = ThreadPoolExecutor(max_workers=self.max_workers,thread_name_prefix="gui_engine")
+            return ActionRunner._executor
+
+    def _get_loop(self):
+        import asyncio
+        with ActionRunner._lock:
+            if ActionRunner._loop is None:
+                ActionRunner._loop = asyncio.new_event_loop()
+                threading.Thread(target=ActionRunner._loop.run_forever,daemon=True).start()
+            return ActionRunner._loop
+
+    def submit(self,fn,*args,on_done=None,on_error=None):
+        """runs fn(*args) in the background and returns its Future"""
+        """on_done(result) or on_error(exception) is called on the tkinter thread when it finishes"""
+        import inspect
+        if inspect.iscoroutinefunction(fn):
+            import asyncio
+            future = asyncio.run_coroutine_threadsafe(fn(*args),self._get_loop())
+        else:
+            future = self._get_executor().submit(fn,*args)
+        self.running[future] = (on_done,on_error)
+        future.add_done_callback(self.results.put)
+        self._interval = self.min_interval
+        self._schedule()
+        return future
+
+    def cancel(self,future):
+        """cancels an action, a thread that has already started can't be stopped so its result is just ignored"""
+        future.cancel()
+        self.running.pop(future,None)
+
+    def _schedule(self):
+        if self._poll_id is None and self.running:
+            self._poll_id = self.widget.after(self._interval,self._poll)
+
+    def _poll(self):
+        self._poll_id = None
+        handled = False
+        while True:
+            try:
+                future = self.results.get_nowait()
+            except queue.Empty:
+                break
+            callbacks = self.running.pop(future,None)
+            if callbacks is None or future.cancelled():
+                continue
+            handled = True
+            on_done,on_error = callbacks
+            error = future.exception()
+            if error is not None:
+                if on_error:
+                    on_error(error)
+                else:
+                    print(error)
+            elif on_done:
+                on_done(future.result())
+        self._interval = self.min_interval if handled else min(self._interval*2,self.max_interval)
+        self._schedule()
+
+    def shutdown(self):
+        """stops polling and forgets everything that is still running"""
+        if self._poll_id is not None:
+            self.widget.after_cancel(self._poll_id)
+            self._poll_id = None
+        for future in list(self.running):
+            self.cancel(future)
+
+class ImageLoader():
+    """ImageLoader decodes and resizes a window's images on worker threads, so the page can be shown with placeholders right away"""
+    """Finished images are turned into PhotoImages on the tkinter thread, through the same backing off queue polling as ActionRunner"""
+    """At most max_in_flight images are decoded at a time, the ones on screen go first, and an image used by several widgets is only decoded once"""
+    _executor = None
+    _lock = threading.Lock()
+
+    def __init__(self,window,max_workers=None,max_in_flight=None,min_interval=10,max_interval=100):
+        self.window = window
+        self.max_workers = max_workers if max_workers else min(8,os.cpu_count() or 2)
+        self.max_in_flight = max_in_flight if max_in_flight else self.max_workers*2
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        """key -> (src,target_size,mode) for the images waiting for a worker, in the order they were requested"""
+        self.pending = OrderedDict()
+        """key -> [(widget,callback)] for every image that is waiting or decoding"""
+        self.waiting = {}
+        """future -> key for the images being decoded"""
+        self.running = {}
+        self.results = queue.SimpleQueue()
+        self._poll_id = None
+        self._interval = min_interval
+        """widget -> if it is on screen, and canvas or toplevel -> its rectangle on screen, kept until something moves or resizes"""
+        self._visibility = {}
+        self._clips = {}
+        """Configure events of every widget in the window reach the toplevel's binding, scrolling a canvas moves the frame inside it"""
+        window.win.bind("<Configure>",self._view_changed,add="+")
+
+    def _get_executor(self):
+        from concurrent.futures import ThreadPoolExecutor
+        with ImageLoader._lock:
+            if ImageLoader._executor is None:
+                ImageLoader._executor = ThreadPoolExecutor(max_workers=self.max_workers,thread_name_prefix="gui_engine_images")
+            return ImageLoader._executor
+
+    def request(self,src,target_size,mode,widget,callback):
+        """calls callback(key,PhotoImage) on the tkinter thread once the image is ready, right away if it is already in IMAGE_CACHE"""
+        """the image is acquired for the callback, the caller has to release the key"""
+        key,photo = IMAGE_CACHE.acquire_cached(src,target_size,mode)
+        if photo is not None:
+            callback(key,photo)
+            return
+        if key in self.waiting:
+            self.waiting[key].append((widget,callback))
+            return
+        self.waiting[key] = [(widget,callback)]
+        self.pending[key] = (src,target_size,mode)
+        self._interval = self.min_interval
+        self._schedule()
+
+    def _dispatch(self):
+        """hands waiting images to the workers, visible ones first and otherwise in page order"""
+        free = self.max_in_flight-len(self.running)
+        if free <= 0 or not self.pending:
+            return
+        keys = list(self.pending)
+        if len(keys) > free:
+            keys.sort(key=lambda key: not any(self._visible(widget) for widget,_ in self.waiting[key]))
+        for key in keys[:free]:
+            src,target_size,mode = self.pending.pop(key)
+            future = self._get_executor().submit(IMAGE_CACHE._load,key,src,target_size,mode)
+            self.running[future] = key
+            future.add_done_callback(self.results.put)
+
+    def _view_changed(self,event):
+        self._visibility.clear()
+        self._clips.clear()
+
+    def _visible(self,widget):
+        """checks if any of the widget is inside its toplevel and the scrolling canvases it sits in, asking Tk only once per change of the view"""
+        visible = self._visibility.get(widget)
+        if visible is None:
+            visible = self._visibility[widget] = self._find_visible(widget)
+        return visible
+
+    def _find_visible(self,widget):
+        try:
+            if not widget.winfo_ismapped():
+                return False
+            left,top = widget.winfo_rootx(),widget.winfo_rooty()
+            right,bottom = left+widget.winfo_width(),top+widget.winfo_height()
+            parent = widget.master
+            while parent is not None:
+                if isinstance(parent,(tk.Canvas,tk.Tk,tk.Toplevel)):
+                    clip = self._clips.get(parent)
+                    if clip is None:
+                        x,y = parent.winfo_rootx(),parent.winfo_rooty()
+                        clip = self._clips[parent] = (x,y,x+parent.winfo_width(),y+parent.winfo_height())
+                    left,top = max(left,clip[0]),max(top,clip[1])
+                    right,bottom = min(right,clip[2]),min(bottom,clip[3])
+                    if left >= right or top >= bottom:
+                        return False
+                parent = parent.master
+            return True
+        except tk.TclError:
+            return False
+
+    def _schedule(self):
+        if self._poll_id is None and (self.running or self.pending):
+            self._poll_id = self.window.win.after(self._interval,self._poll)
+
+    def _poll(self):
+        self._poll_id = None
+        handled = False
+        while True:
+            try:
+                future = self.results.get_nowait()
+            except queue.Empty:
+                break
+            key = self.running.pop(future,None)
+            if key is None or future.cancelled():
+                continue
+            handled = True
+            callbacks = self.waiting.pop(key,[])
+            error = future.exception()
+            if error is not None:
+                """the placeholder stays"""
+                print(error)
+                continue
+            img_pil = future.result()
+            for widget,callback in callbacks:
+                if self.window.destroyed:
+                    break
+                photo = IMAGE_CACHE.acquire_loaded(key,img_pil)
+                try:
+                    callback(key,photo)
+                except tk.TclError:
+                    """the widget was destroyed while its image was decoding"""
+                    IMAGE_CACHE.release(key)
+        self._dispatch()
+        self._interval = self.min_interval if handled else min(self._interval*2,self.max_interval)
+        self._schedule()
+
+    def shutdown(self):
+        """stops polling and drops every image that hasn't been swapped in yet"""
+        if self._poll_id is not None:
+            self.window.win.after_cancel(self._poll_id)
+            self._poll_id = None
+        for future in self.running:
+            future.cancel()
+        self.running.clear()
+        self.pending.clear()
+        self.waiting.clear()
+        self._visibility.clear()
+        self._clips.clear()
+
+"""The active BuildProfiler, when it is None profiling costs one global lookup per element"""
+PROFILER = None
+
+class BuildProfiler():
+    """BuildProfiler records how long each part of building a page takes, per tag and id"""
+    """Spans record wall time, the Tk widgets and Tcl commands they created, and how deeply they are nested"""
+    """The results can be exported as Chrome trace-event JSON (chrome://tracing or Perfetto) or printed as a summary table"""
+    def __init__(self):
+        """each event is a dict of category, name, id, start, duration, depth, widgets, tcl and thread"""
+        self.events = []
+        self.widgets_created = 0
+        self._origin = time.perf_counter()
+        self._local = threading.local()
+        self._setup = None
+
+    def enable(self):
+        """makes this the active profiler, and starts counting widgets as they are created"""
+        global PROFILER
+        if PROFILER is not None:
+            PROFILER.disable()
+        PROFILER = self
+        setup = self._setup = tk.BaseWidget._setup
+        profiler = self
+        def counting_setup(widget,master,cnf):
+            profiler.widgets_created += 1
+            return setup(widget,master,cnf)
+        tk.BaseWidget._setup = counting_setup
+        return self
+
+    def disable(self):
+        """stops profiling, the recorded events are kept"""
+        global PROFILER
+        if PROFILER is self:
+            PROFILER = None
+        if self._setup is not None:
+            tk.BaseWidget._setup = self._setup
+            self._setup = None
+        return self
+
+    def span(self,category,name,ident=None,widget=None):
+        """returns a context manager that records one event, widget is used to count Tcl commands"""
+        return _ProfileSpan(self,category,name,ident,widget)
+
+    def _stack(self):
+        stack = getattr(self._local,"stack",None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+    def export_chrome_trace(self,path=None):
+        """returns the events as Chrome trace-event JSON, and writes them to path if one is given"""
+        import json
+        trace = {"displayTimeUnit":"ms","traceEvents":[{
+            "name":event["name"] if event["id"] is None else f"{event['name']}#{event['id']}",
+            "cat":event["category"],
+            "ph":"X",
+            "ts":round(event["start"]*1e6,3),
+            "dur":round(event["duration"]*1e6,3),
+            "pid":os.getpid(),
+            "tid":event["thread"],
+            "args":{"id":event["id"],"depth":event["depth"],"widgets":event["widgets"],"tcl":event["tcl"]},
+        } for event in self.events]}
+        text = json.dumps(trace)
+        if path:
+            with open(path,"w") as file:
+                file.write(text)
+        return text
+
+    def summary(self,limit=20):
+        """returns a table of the categories and tags that took the most time, self time excludes nested spans"""
+        totals = {}
+        for event in self.events:
+            row = totals.setdefault((event["category"],event["name"]),[0,0.0,0.0,0,0])
+            row[0] += 1
+            row[1] += event["duration"]
+            row[2] += event["self"]
+            row[3] += event["widgets"] if event["depth"] == 0 else 0
+            row[4] += (event["tcl"] or 0) if event["depth"] == 0 else 0
+        lines = [f"{'category':<10}{'name':<24}{'count':>8}{'total ms':>12}{'self ms':>12}{'widgets':>10}{'tcl':>10}"]
+        for (category,name),(count,total,own,widgets,tcl) in sorted(totals.items(),key=lambda item: -item[1][2])[:limit]:
+            lines.append(f"{category:<10}{str(name)[:23]:<24}{count:>8}{total*1000:>12.2f}{own*1000:>12.2f}{widgets:>10}{tcl:>10}")
+        return "\n".join(lines)
+
+class _ProfileSpan():
+    def __init__(self,profiler,category,name,ident,widget):
+        self.profiler = profiler
+        self.event = {"category":category,"name":name,"id":ident}
+        self.widget = widget
+
+    def __enter__(self):
+        stack = self.profiler._stack()
+        self.event["depth"] = len(stack)
+        self.event["thread"] = threading.get_ident()
+        self.children = 0.0
+        stack.append(self)
+        self.widgets = self.profiler.widgets_created
+        self.tcl = int(self.widget.tk.call("info","cmdcount")) if self.widget is not None else None
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self,*exc):
+        end = time.perf_counter()
+        event = self.event
+        event["start"] = self.start-self.profiler._origin
+        event["duration"] = end-self.start
+        event["self"] = event["duration"]-self.children
+        event["widgets"] = self.profiler.widgets_created-self.widgets
+        event["tcl"] = int(self.widget.tk.call("info","cmdcount"))-self.tcl-1 if self.tcl is not None else None
+        stack = self.profiler._stack()
+        stack.pop()
+        if stack:
+            stack[-1].children += event["duration"]
+        self.profiler.events.append(event)
+        return False
+
+class ListProvider():
+    """ListProvider adapts a pair of callbacks into the data provider interface a VirtualListbox reads from"""
+    """length() returns the number of rows and fetch(start,stop) returns the rows in that range"""
+    def __init__(self,length,fetch):
+        self.length = length
+        self.fetch = fetch
+
+    def __len__(self):
+        return self.length()
+
+    def __getitem__(self,index):
+        if isinstance(index,slice):
+            start,stop,_ = index.indices(len(self))
+            return self.fetch(start,stop)
+        return self.fetch(index,index+1)[0]
+
+class VirtualListbox(tk.Frame):
+    """VirtualListbox is a scrolling listbox that only ever holds the rows that are visible"""
+    """Rows are fetched from a data provider, anything that supports len() and slicing, as the list is scrolled"""
+    """The selection is kept as a set of indices into the provider, so it survives scrolling"""
+    def __init__(self,parent,provider,height=10,width=20,selectmode=tk.BROWSE):
+        super().__init__(parent)
+        self.provider = provider
+        self.height = height
+        self.selectmode = selectmode
+        """index of the first visible row in the provider"""
+        self.offset = 0
+        self.selected = set()
+        self.listbox = tk.Listbox(self,height=height,width=width,selectmode=selectmode,exportselection=False)
+        self.scrollbar = tk.Scrollbar(self,orient=tk.VERTICAL,command=self.yview)
+        self.scrollbar.grid(row=0,column=1,sticky=tk.N+tk.S)
+        self.listbox.grid(row=0,column=0,sticky=tk.N+tk.S+tk.E+tk.W)
+        self.listbox.bind("<<ListboxSelect>>",self._on_select)
+        self.listbox.bind("<MouseWheel>",lambda e: self.yview("scroll",-e.delta//120 or (-1 if e.delta > 0 else 1),"units"))
+        self.listbox.bind("<Button-4>",lambda e: self.yview("scroll",-3,"units"))
+        self.listbox.bind("<Button-5>",lambda e: self.yview("scroll",3,"units"))
+        self.listbox.bind("<Up>",lambda e: self._move_active(-1))
+        self.listbox.bind("<Down>",lambda e: self._move_active(1))
+        self.listbox.bind("<Prior>",lambda e: self.yview("scroll",-1,"pages"))
+        self.listbox.bind("<Next>",lambda e: self.yview("scroll",1,"pages"))
+        self.refresh()
+
+    def set_provider(self,provider):
+        """swaps the data provider, clearing the selection and scrolling back to the top"""
+        self.provider = provider
+        self.offset = 0
+        self.selected = set()
+        self.refresh()
+
+    def refresh(self):
+        """fetches the visible rows from the provider and redraws them"""
+        size = len(self.provider)
+        self.offset = max(0,min(self.offset,size-self.height))
+        rows = self.provider[self.offset:self.offset+self.height]
+        self.listbox.delete(0,tk.END)
+        self.listbox.insert(tk.END,*[str(row) for row in rows])
+        for i in range(len(rows)):
+            if self.offset+i in self.selected:
+                self.listbox.selection_set(i)
+        if size:
+            self.scrollbar.set(self.offset/size,(self.offset+len(rows))/size)
+        else:
+            self.scrollbar.set(0,1)
+
+    def yview(self,*args):
+        """scrollbar command, moves the window of visible rows over the provider"""
+        if args[0] == "moveto":
+            self.offset = int(float(args[1])*len(self.provider))
+        elif args[0] == "scroll":
+            amount = int(args[1])
+            if args[2] == "pages":
+                amount *= self.height
+            self.offset += amount
+        self.refresh()
+        return "break"
+
+    def _move_active(self,step):
+        """moves the keyboard selection, scrolling when it goes off the top or bottom of the visible rows"""
+        current = self.listbox.curselection()
+        index = self.offset+(current[0] if current else 0)+step
+        if index < 0 or index >= len(self.provider):
+            return "break"
+        if index < self.offset:
+            self.offset = index
+        elif index >= self.offset+self.height:
+            self.offset = index-self.height+1
+        if self.selectmode in (tk.BROWSE,tk.SINGLE):
+            self.selected = {index}
+        self.refresh()
+        self.listbox.activate(index-self.offset)
+        return "break"
+
+    def _on_select(self,event):
+        visible = set(self.offset+i for i in self.listbox.curselection())
+        if self.selectmode in (tk.BROWSE,tk.SINGLE):
+            self.selected = visible
+        else:
+            """only the visible rows can have changed, so keep the selection for the rest"""
+            self.selected.difference_update(range(self.offset,self.offset+self.height))
+            self.selected.update(visible)
+
+    def get_selection(self):
+        """returns the sorted provider indices of the selected rows"""
+        return sorted(self.selected)
+
+    def get_selected_items(self):
+        """returns the selected rows, fetching only those rows from the provider"""
+        return [self.provider[i:i+1][0] for i in self.get_selection()]
+
+class LayoutScheduler():
+    """LayoutScheduler merges layout work, like recomputing a canvas scrollregion, so it runs at most once per frame"""
+    """Each job has a key, scheduling a key that is already waiting just replaces its callback, so a storm of <Configure> events costs one update"""
+    """While it is paused jobs only pile up, they run once the last resume() is called"""
+    def __init__(self,widget,interval=16):
+        self.widget = widget
+        self.interval = interval
+        """key -> callback for the jobs waiting for the next frame"""
+        self.jobs = OrderedDict()
+        self.paused = 0
+        self._after_id = None
+
+    def schedule(self,key,callback):
+        """runs callback in the next frame, once, no matter how many times the key is scheduled before then"""
+        self.jobs[key] = callback
+        self._arm()
+
+    def _arm(self):
+        if self._after_id is None and not self.paused and self.jobs:
+            self._after_id = self.widget.after(self.interval,self.flush)
+
+    def flush(self):
+        """runs every waiting job now, jobs scheduled while they run wait for the next frame"""
+        if self._after_id is not None:
+            self.widget.after_cancel(self._after_id)
+            self._after_id = None
+        jobs,self.jobs = self.jobs,OrderedDict()
+        for callback in jobs.values():
+            try:
+                callback()
+            except tk.TclError:
+                """the widget was destroyed while the job was waiting"""
+                pass
+        self._arm()
+
+    def pause(self):
+        """holds back layout, for bulk builds that would otherwise trigger it over and over"""
+        self.paused += 1
+        if self._after_id is not None:
+            self.widget.after_cancel(self._after_id)
+            self._after_id = None
+
+    def resume(self):
+        self.paused = max(0,self.paused-1)
+        self._arm()
+
+    def cancel(self):
+        """drops every waiting job"""
+        self.jobs.clear()
+        if self._after_id is not None:
+            self.widget.after_cancel(self._after_id)
+            self._after_id = None
+
+class VirtualScrollFrame(tk.Frame):
+    """VirtualScrollFrame is a scrolling div for long lists of repeated rows, it only realizes the rows near the viewport"""
+    """Rows that scroll out of view are recycled for the rows scrolling into view, their widgets get reconfigured in place when the rows have the same structure"""
+    def __init__(self,parent,window,rows,rowheight=24,height=200,width=200,overscan=2):
+        super().__init__(parent,relief=tk.GROOVE,bd=1)
+        self.window = window
+        self.rowheight = rowheight
+        self.overscan = overscan
+        self.canvas = tk.Canvas(self,highlightthickness=0,height=height,width=width)
+        self.scrollbar = tk.Scrollbar(self,orient=tk.VERTICAL,command=self.canvas.yview)
+        self.canvas['yscrollcommand'] = self._on_scroll
+        self.scrollbar.grid(row=0,column=1,sticky=tk.N+tk.S)
+        self.canvas.grid(row=0,column=0,sticky=tk.W)
+        self.canvas.bind("<Configure>",self._on_configure)
+        """row index -> slot for the realized rows, and the slots that are free to be reused"""
+        self.visible = {}
+        self.pool = []
+        self.rows = []
+        self.set_rows(rows)
+
+    def set_rows(self,rows):
+        """replaces the rows, the rows are html tags that get built with the Window's BODY_ACTIONS"""
+        self.rows = list(rows)
+        self.canvas.configure(scrollregion=(0,0,0,len(self.rows)*self.rowheight))
+        for index in list(self.visible):
+            if index < len(self.rows):
+                self._bind(self.visible[index],index)
+            else:
+                self._recycle(index)
+        self.update_rows()
+
+    def _on_scroll(self,first,last):
+        self.scrollbar.set(first,last)
+        self.update_rows()
+
+    def _on_configure(self,event):
+        self.window.layout.schedule(self,self._relayout)
+
+    def _relayout(self):
+        width = self.canvas.winfo_width()
+        for slot in self.visible.values():
+            self.canvas.itemconfigure(slot.item,width=width)
+        self.update_rows()
+
+    def update_rows(self):
+        """realizes the rows near the viewport, recycling the slots of the rows that are no longer near it"""
+        top = self.canvas.canvasy(0)
+        height = max(self.canvas.winfo_height(),int(self.canvas['height']))
+        first = max(0,int(top//self.rowheight)-self.overscan)
+        last = min(len(self.rows),int((top+height)//self.rowheight)+1+self.overscan)
+        for index in list(self.visible):
+            if index < first or index >= last:
+                self._recycle(index)
+        for index in range(first,last):
+            if index not in self.visible:
+                slot = self.pool.pop() if self.pool else self._new_slot()
+                self._bind(slot,index)
+                self.canvas.coords(slot.item,0,index*self.rowheight)
+                self.visible[index] = slot
+
+    def _new_slot(self):
+        slot = _RowSlot(tk.Frame(self.canvas))
+        slot.item = self.canvas.create_window((0,-self.rowheight),window=slot.frame,anchor='nw',height=self.rowheight,width=self.canvas.winfo_width())
+        return slot
+
+    def _recycle(self,index):
+        """moves the slot out of the scrollregion and puts it back in the pool"""
+        slot = self.visible.pop(index)
+        self.canvas.coords(slot.item,0,-2*self.rowheight)
+        self.pool.append(slot)
+
+    def _bind(self,slot,index):
+        """shows the row in the slot, reusing the slot's widgets if possible"""
+        tag = self.rows[index]
+        if slot.tag is tag:
+            return
+        if slot.tag is None or not self.window.patch_elements([slot.tag],slot.elements,[tag]):
+            self.window._destroy_node(slot.node)
+            slot.elements = self.window.build_under(slot.node,[tag],slot.frame)
+        slot.tag = tag
+
+class LogView(tk.Frame):
+    """LogView is a read only text box for live output, like logs or telemetry, that other threads can write to as fast as they like"""
+    """append() only puts lines on a queue, the tkinter thread takes everything queued once per frame and inserts it with a single Text insert"""
+    """The last maxlines lines are kept in a ring buffer, older ones are trimmed from the Text too, and a filter can hide lines without losing them"""
+    def __init__(self,parent,height=20,width=80,maxlines=10000,autoscroll=True,filter=None,min_interval=16,max_interval=100):
+        super().__init__(parent)
+        self.text = tk.Text(self,height=height,width=width,wrap=tk.NONE,state=tk.DISABLED)
+        self.scrollbar = tk.Scrollbar(self,orient=tk.VERTICAL,command=self.text.yview)
+        self.text['yscrollcommand'] = self.scrollbar.set
+        self.text.grid(row=0,column=0,sticky=tk.N+tk.S+tk.E+tk.W)
+        self.scrollbar.grid(row=0,column=1,sticky=tk.N+tk.S)
+        self.maxlines = maxlines
+        self.autoscroll = autoscroll
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        """lines written from any thread and not shown yet, deque appends and pops are thread safe"""
+        """it holds maxlines too, so if the tkinter thread stalls the oldest lines are dropped instead of the queue growing"""
+        self.pending = deque(maxlen=maxlines)
+        """the last maxlines lines, shown or filtered out"""
+        self.buffer = deque(maxlen=maxlines)
+        self.shown = 0
+        self.dropped = 0
+        self._partial = ""
+        self._write_lock = threading.Lock()
+        self._filter = None
+        self.set_filter(filter)
+        self._interval = min_interval
+        self._poll_id = self.after(self._interval,self._poll)
+
+    def append(self,line):
+        """adds a line, safe to call from any thread, a line with newlines in it is added as several lines"""
+        self._queue(str(line).split("\n"))
+
+    def extend(self,lines):
+        """adds several lines, safe to call from any thread"""
+        self._queue([part for line in lines for part in str(line).split("\n")])
+
+    def write(self,text):
+        """file like write, so a LogView can be a logging stream or print's file, text is split into lines at newlines"""
+        with self._write_lock:
+            lines = (self._partial+text).split("\n")
+            self._partial = lines.pop()
+            self._queue(lines)
+        return len(text)
+
+    def _queue(self,lines):
+        """puts lines on the pending queue, counting the ones its maxlen pushes out as dropped"""
+        overflow = len(self.pending)+len(lines)-self.maxlines
+        if overflow > 0:
+            self.dropped += overflow
+        self.pending.extend(lines)
+
+    def flush(self):
+        pass
+
+    def set_filter(self,filter):
+        """shows only the lines that match, filter is a regular expression, a function taking a line, or None for every line"""
+        if isinstance(filter,str):
+            filter = re.compile(filter).search
+        self._filter = filter
+        self._render(list(self.buffer),replace=True)
+
+    def clear(self):
+        self.pending.clear()
+        self.buffer.clear()
+        self._render([],replace=True)
+
+    def _poll(self):
+        """takes everything queued since the last frame, backing off while nothing is written"""
+        self._poll_id = None
+        count = len(self.pending)
+        if count:
+            lines = [self.pending.popleft() for _ in range(count)]
+            self.buffer.extend(lines)
+            self._render(lines)
+            self._interval = self.min_interval
+        else:
+            self._interval = min(self._interval*2,self.max_interval)
+        self._poll_id = self.after(self._interval,self._poll)
+
+    def _render(self,lines,replace=False):
+        """inserts lines in one go, trimming the oldest shown lines past maxlines"""
+        if self._filter is not None:
+            lines = [line for line in lines if self._filter(line)]
+        if not lines and not replace:
+            return
+        at_bottom = self.text.yview()[1] >= 0.999
+        self.text.configure(state=tk.NORMAL)
+        if replace:
+            self.text.delete("1.0",tk.END)
+            self.shown = 0
+        if lines:
+            self.text.insert(tk.END,"\n".join(lines)+"\n")
+            self.shown += len(lines)
+        if self.shown > self.maxlines:
+            self.text.delete("1.0",f"{self.shown-self.maxlines+1}.0")
+            self.shown = self.maxlines
+        self.text.configure(state=tk.DISABLED)
+        if self.autoscroll and at_bottom:
+            self.text.see(tk.END)
+
+    def destroy(self):
+        if self._poll_id is not None:
+            self.after_cancel(self._poll_id)
+            self._poll_id = None
+        super().destroy()
+
+class _RowSlot():
+    """a realized row of a VirtualScrollFrame, the frame and canvas item it lives in and what was built in it"""
+    def __init__(self,frame):
+        self.frame = frame
+        self.item = None
+        self.tag = None
+        self.elements = []
+        """the row's tag is built under this node, so the buttons and frames it added can be removed when the slot is rebuilt"""
+        """it is detached since patching a slot for another row doesn't update its nodes' tags, so they can't be queried"""
+        self.node = Node(None,frame,detached=True)
+
 class Form():
     """Form Base Class, holds the attributes and fields for the forms"""
     """Other windows will have their own derived version of the Form class to take the correct actions when the form is submitted"""
     def __init__(self,action=None,window=None):
         self.fields = {}
         self.window = window
+        """names of the fields that have changed since the form was built or last marked clean"""
+        self.dirty = set()
+        """for_label fields by the name of the field they show, they are pointed at every field added with that name, so a rebuilt field keeps its labels"""
+        self._labels = {}
+        """Tcl variable name -> field name, for the one Tcl command every variable trace calls"""
+        self._variable_fields = {}
+        """the widget the trace command was registered on, deleting it through that widget keeps its _tclCommands in step"""
+        self._trace_command = None
+        self._trace_command_owner = None
 
     def add_field(self,field):
         """adds a field to the form"""
         self.fields[field.name] = field
+        if self.window is not None:
+            self.window.field_added(field)
         if field.ftype == "for_label":
-            var = [f for f in self.fields if f.name == field.data[0]][0]
-            field.data[1]["textvariable"] = var.data
+            self._labels.setdefault(field.data[0],[]).append(field)
+            target = self.fields.get(field.data[0])
+            if target is not None:
+                field.data[1]["textvariable"] = target.data
+            return
+        for label in self._labels.get(field.name,()):
+            label.data[1]["textvariable"] = field.data
+        self._track(field)
+
+    def remove_field(self,field):
+        """forgets a field whose widgets were destroyed, unless a new field with the same name has already replaced it"""
+        if self.fields.get(field.name) is field:
+            del self.fields[field.name]
+            self.dirty.discard(field.name)
+        if field.ftype == "for_label":
+            labels = self._labels.get(field.data[0],[])
+            if field in labels:
+                labels.remove(field)
+            if not labels:
+                self._labels.pop(field.data[0],None)
+        elif isinstance(field.data,tk.Variable):
+            self._variable_fields.pop(field.data._name,None)
+        elif field.ftype == "multiple_select":
+            for var,_ in field.data:
+                self._variable_fields.pop(var._name,None)
+
+    def _track(self,field):
+        """starts tracking changes to a field's value, display labels are written by the program so they aren't tracked"""
+        if field.ftype in (str,"select"):
+            self._trace(field.data,field.name)
+        elif field.ftype == "listbox":
+            """a batched listbox is only created in Tcl when the batch is flushed"""
+            bind = lambda: field.data[0].bind("<<ListboxSelect>>",lambda e, name=field.name: self.dirty.add(name),add="+")
+            if self.window is not None:
+                self.window.after_batch(bind)
+            else:
+                bind()
+        elif field.ftype == "virtual_listbox":
+            field.data.listbox.bind("<<ListboxSelect>>",lambda e, name=field.name: self.dirty.add(name),add="+")
+
+    def _trace(self,var,name):
+        if self._trace_command is None:
+            self._trace_command_owner = var._root
+            self._trace_command = var._root.register(self._variable_written)
+        self._variable_fields[var._name] = name
+        var._tk.call("trace","add","variable",var._name,"write",self._trace_command)
+
+    def _variable_written(self,name1,name2,op):
+        field_name = self._variable_fields.get(name1)
+        if field_name is not None:
+            self.dirty.add(field_name)
+
+    def mark_clean(self):
+        """forgets which fields have changed, call it after the changes have been sent"""
+        self.dirty.clear()
+
+    def snapshot(self,names=None):
+        """returns a dict of field name -> value for every field, or just the given ones, reading all the Tcl values in one call"""
+        """text inputs, selects and display labels give strings, multiple selects give the selected values and listboxes give the selected items"""
+        names = list(self.fields) if names is None else [name for name in names if name in self.fields]
+        words = []
+        """name, reader, and if the reader takes the next value read from Tcl"""
+        readers = []
+        for name in names:
+            field = self.fields[name]
+            if field.ftype in (str,"select","label"):
+                words.append(f"[set {TagUtility.tcl_quote(field.data._name)}]")
+                readers.append((name,lambda value: value,True))
+            elif field.ftype == "multiple_select":
+                words.append("[list "+" ".join(f"[set {TagUtility.tcl_quote(var._name)}]" for var,_ in field.data)+"]")
+                readers.append((name,lambda value, options=field.data: [option for (_,option),on in zip(options,self._split(value)) if int(on)],True))
+            elif field.ftype == "listbox" and isinstance(field.data[0],LayoutWidget):
+                """headless listboxes aren't Tcl commands"""
+                readers.append((name,lambda listbox=field.data[0], items=field.data[1]: [items[i] for i in listbox.curselection()],False))
+            elif field.ftype == "listbox":
+                words.append(f"[{field.data[0]._w} curselection]")
+                readers.append((name,lambda value, items=field.data[1]: [items[int(i)] for i in self._split(value)],True))
+            elif field.ftype == "virtual_listbox":
+                readers.append((name,field.data.get_selected_items,False))
+            elif field.ftype != "for_label":
+                readers.append((name,lambda data=field.data: data.get() if hasattr(data,"get") else data,False))
+        values = iter(self._split(self._interp().eval("list "+" ".join(words))) if words else ())
+        snapshot = {}
+        for name,reader,from_tcl in readers:
+            snapshot[name] = reader(next(values)) if from_tcl else reader()
+        return snapshot
+
+    def snapshot_json(self,names=None):
+        """returns the snapshot as a JSON string"""
+        import json
+        return json.dumps(self.snapshot(names))
+
+    def changed_fields(self):
+        """returns a snapshot of only the fields that changed since the form was built or last marked clean"""
+        return self.snapshot(self.dirty)
+
+    def _interp(self):
+        return self.window.win.tk
+
+    def _split(self,value):
+        return self._interp().splitlist(value)
 
     def add_to_multiple_select(self,field_name,data):
         sel = self.get_field(field_name)
         sel.data.append(data)
+        if self.window is not None:
+            self.window.option_added(sel,data)
+        self._trace(data[0],field_name)
+
+    def remove_from_multiple_select(self,sel,data):
+        """takes an option's (IntVar,value) pair out of a multiple select when the option is destroyed"""
+        for i,option in enumerate(sel.data):
+            if option is data:
+                del sel.data[i]
+                break
+        self._variable_fields.pop(data[0]._name,None)
 
     def get_field(self,name):
         return self.fields[name]
@@ -163,6 +1936,359 @@ class Form():
     def submit(self):
         self.print_all_fields()
 
+class _ItemFields():
+    """lets str.format_map read the fields of a repeat item, by key for mappings and sequences or by attribute for objects"""
+    def __init__(self,item):
+        self.item = item
+
+    def __getitem__(self,name):
+        if name == "item":
+            return self.item
+        if hasattr(self.item,"__getitem__") and not isinstance(self.item,str):
+            try:
+                return self.item[name]
+            except (KeyError,TypeError,IndexError):
+                pass
+        return getattr(self.item,name)
+
+class Repeat():
+    """Repeat expands a row template for every item of a Python iterable, for <repeat source="name" key="field"> tags"""
+    """{field} in the template's text and attributes is filled in from each item, and rows are matched to items by key"""
+    """When the items change, update() only builds new rows, destroys removed ones, repacks moved ones and patches the ones whose content changed"""
+    def __init__(self,window,tag,frame,node,key=None):
+        self.window = window
+        self.template = [child for child in tag if child.name is not None or str(child).strip()]
+        self.frame = frame
+        """the repeat tag's Node, its children are the rows' Nodes in order"""
+        self.node = node
+        self.key = key
+        """key -> row Node, in display order"""
+        self.rows = OrderedDict()
+        """rows are packed after this empty frame, so a row can always be put after the one before it"""
+        self.head = window.toolkit.Frame(frame)
+        self.head.pack(side=tk.TOP)
+
+    def render(self,item):
+        """fills in the template for one item, returning a LiteTag div holding the row"""
+        fields = _ItemFields(item)
+        row = LiteTag("div")
+        row.contents = [Repeat._render(child,fields,row) for child in self.template]
+        return row
+
+    @staticmethod
+    def _render(tag,fields,parent):
+        if tag.name is None:
+            text = str(tag)
+            return LiteString(text.format_map(fields) if "{" in text else text)
+        rendered = LiteTag(tag.name,{k:(v.format_map(fields) if isinstance(v,str) and "{" in v else v) for k,v in tag.attrs.items()},parent)
+        rendered.contents = [Repeat._render(child,fields,rendered) for child in tag]
+        return rendered
+
+    def item_key(self,item,index):
+        return str(_ItemFields(item)[self.key]) if self.key else str(index)
+
+    def update(self,items):
+        """reconciles the rows with a new sequence of items"""
+        old_rows = self.rows
+        new_rows = OrderedDict()
+        new_keys = []
+        seen = {}
+        for index,item in enumerate(items):
+            key = self.item_key(item,index)
+            """items that share a key get the number of the repeat appended, so every row still has a key of its own"""
+            count = seen.get(key,0)
+            seen[key] = count+1
+            if count:
+                key = (key,count)
+            rendered = self.render(item)
+            row = old_rows.pop(key,None)
+            if row is None:
+                row = self._build_row(rendered)
+            elif not TagUtility.same_tag(row.tag,rendered):
+                self.window._patch_children(row,rendered)
+                self.window._retag(row,rendered)
+            new_rows[key] = row
+            new_keys.append(key)
+        for row in old_rows.values():
+            self.window._destroy_node(row)
+
+        """the kept rows that are already in the right order relative to each other stay put, everything else is packed after the row before it"""
+        old_order = {key:i for i,key in enumerate(self.rows) if key in new_rows}
+        stay = Repeat._longest_increasing([key for key in new_keys if key in old_order],old_order)
+        previous = self.head
+        for key in new_keys:
+            row = new_rows[key]
+            if key not in stay:
+                row.widget().pack(side=tk.TOP,fill=tk.X,anchor=tk.W,after=previous)
+            previous = row.widget()
+        self.rows = new_rows
+        self.node.children = list(new_rows.values())
+        self.window.registry.stale = True
+
+    @staticmethod
+    def _longest_increasing(keys,order):
+        """returns the set of keys in the longest run whose old positions are increasing, those rows don't need to move"""
+        tails = []
+        tail_keys = []
+        links = {}
+        for key in keys:
+            position = bisect.bisect_left(tails,order[key])
+            links[key] = tail_keys[position-1] if position else None
+            if position == len(tails):
+                tails.append(order[key])
+                tail_keys.append(key)
+            else:
+                tails[position] = order[key]
+                tail_keys[position] = key
+        stay = set()
+        key = tail_keys[-1] if tail_keys else None
+        while key is not None:
+            stay.add(key)
+            key = links[key]
+        return stay
+
+    def _build_row(self,rendered):
+        """builds a row in its own frame and records it as a Node under the repeat's Node"""
+        row_frame = self.window.toolkit.Frame(self.frame)
+        row = Node(rendered,self.frame,self.node)
+        elements = self.window.build_under(row,rendered,row_frame)
+        row.element = (row_frame,elements)
+        return row
+
+class Node():
+    """Node records what a Window built for one tag, so the page can be diffed against a new version and patched later"""
+    def __init__(self,tag,container,parent=None,args=(),kwargs=None,detached=False):
+        self.tag = tag
+        """detached nodes, and everything under them, are left out of the WidgetRegistry, their widgets get reused for other tags"""
+        self.detached = detached or (parent is not None and parent.detached)
+        """what the BODY_ACTIONS function returned, a widget or a (widget,elements) tuple"""
+        self.element = None
+        self.container = container
+        self.parent = parent
+        self.children = []
+        """the Form fields that were added while building this tag"""
+        self.fields = []
+        """the (multiple select field,(IntVar,value)) options that were added while building this tag"""
+        self.options = []
+        """the buttons keys, and the (key,frame) and (key,repeat) entries, that were added to the Window while building this tag"""
+        self.buttons = []
+        self.frames = []
+        self.repeats = []
+        """set by the WidgetRegistry when it first indexes the node, later nodes get bigger numbers, re-indexing a retagged node keeps it"""
+        self.sequence = 0
+        self.args = args
+        self.kwargs = kwargs if kwargs else {}
+
+    def widget(self):
+        """returns the outermost widget built for the tag"""
+        return self.element[0] if isinstance(self.element,tuple) else self.element
+
+    def key(self):
+        """returns the key used to match this node against a new version of the page, based on the id or name"""
+        key = TagUtility.get_attribute(self.tag,"id") or TagUtility.get_attribute(self.tag,"name")
+        return (self.tag.name,key) if key else None
+
+class WidgetRegistry():
+    """WidgetRegistry indexes every Node a Window builds by id, name, tag and class, and answers CSS style selector queries from those indexes"""
+    """Selectors can use tag names, *, #id, .class, [attr], [attr=value], and the descendant and > combinators, and can be grouped with commas"""
+    """The rightmost part of a selector picks its candidates from the most selective index, and only their ancestors are checked against the rest"""
+    SELECTOR_TOKENS = re.compile(r"""\s*(>)\s*|\s+|([a-zA-Z_][\w-]*|\*)|#([\w-]+)|\.([\w-]+)|\[\s*([\w-]+)\s*(?:=\s*(?:"([^"]*)"|'([^']*)'|([^\]\s]*))\s*)?\]""")
+
+    def __init__(self):
+        """value -> {node:None}, dicts keep the nodes in the order they were built"""
+        self.by_id = {}
+        self.by_name = {}
+        self.by_tag = {}
+        self.by_class = {}
+        self.nodes = {}
+        """node -> the (id,name,tag,classes) it was indexed under, to remove it again"""
+        self._keys = {}
+        self._parsed = {}
+        self._sequence = 0
+        """the Window's root node, and if patching has built or moved nodes out of page order since the nodes were last numbered"""
+        self.root = None
+        self.stale = False
+
+    @staticmethod
+    def classes(tag):
+        """returns the tag's class names, Beautiful Soup already splits them into a list"""
+        value = tag.get("class")
+        if not value:
+            return []
+        return list(value) if isinstance(value,list) else value.split()
+
+    def add(self,node):
+        tag = node.tag
+        keys = (tag.get("id"),tag.get("name"),tag.name,tuple(WidgetRegistry.classes(tag)))
+        self._keys[node] = keys
+        self.nodes[node] = None
+        if not node.sequence:
+            self._sequence += 1
+            node.sequence = self._sequence
+        for index,value in ((self.by_id,keys[0]),(self.by_name,keys[1]),(self.by_tag,keys[2])):
+            if value:
+                index.setdefault(value,{})[node] = None
+        for value in keys[3]:
+            self.by_class.setdefault(value,{})[node] = None
+
+    def remove(self,node):
+        keys = self._keys.pop(node,None)
+        if keys is None:
+            return
+        del self.nodes[node]
+        for index,value in ((self.by_id,keys[0]),(self.by_name,keys[1]),(self.by_tag,keys[2])):
+            if value:
+                WidgetRegistry._discard(index,value,node)
+        for value in keys[3]:
+            WidgetRegistry._discard(self.by_class,value,node)
+
+    @staticmethod
+    def _discard(index,value,node):
+        nodes = index.get(value)
+        if nodes is not None:
+            nodes.pop(node,None)
+            if not nodes:
+                del index[value]
+
+    def update(self,node):
+        """re-indexes a node whose tag was swapped for a new version"""
+        if node in self._keys:
+            self.remove(node)
+            self.add(node)
+
+    def clear(self):
+        for index in (self.by_id,self.by_name,self.by_tag,self.by_class,self.nodes,self._keys):
+            index.clear()
+        self.root = None
+        self.stale = False
+
+    def parse(self,selector):
+        """turns a selector into a list of alternatives, each a list of (combinator,compound) from right to left"""
+        """a compound is (tag,id,classes,[(attr,value)]), value is None when the attribute only has to be there"""
+        parsed = self._parsed.get(selector)
+        if parsed is not None:
+            return parsed
+        parsed = []
+        for part in selector.split(","):
+            steps = []
+            compound = None
+            pending = " "
+            position = 0
+            part = part.strip()
+            while position < len(part):
+                match = WidgetRegistry.SELECTOR_TOKENS.match(part,position)
+                if match is None or match.end() == position:
+                    raise ValueError(f"can't parse selector {selector!r} at {part[position:]!r}")
+                position = match.end()
+                child,name,id_,cls,attr = match.group(1,2,3,4,5)
+                if child or (name is None and id_ is None and cls is None and attr is None):
+                    """a combinator, > or whitespace"""
+                    if compound is not None:
+                        steps.append((pending,compound))
+                        compound = None
+                        pending = " "
+                    if child:
+                        pending = ">"
+                    continue
+                if compound is None:
+                    compound = [None,None,[],[]]
+                if name is not None:
+                    compound[0] = None if name == "*" else name
+                elif id_ is not None:
+                    compound[1] = id_
+                elif cls is not None:
+                    compound[2].append(cls)
+                else:
+                    value = next((v for v in match.group(6,7,8) if v is not None),None)
+                    compound[3].append((attr,value))
+            if compound is None:
+                raise ValueError(f"selector {selector!r} ends without an element")
+            steps.append((pending,compound))
+            """steps[i] holds the combinator that joins it to the step before it, shift them so each step knows how to reach its ancestor"""
+            alternative = []
+            for i in range(len(steps)-1,-1,-1):
+                alternative.append((steps[i][0] if i > 0 else None,steps[i][1]))
+            parsed.append(alternative)
+        self._parsed[selector] = parsed
+        return parsed
+
+    @staticmethod
+    def matches(node,compound):
+        tag = node.tag
+        if tag is None:
+            return False
+        name,id_,classes,attrs = compound
+        if name is not None and tag.name != name:
+            return False
+        if id_ is not None and tag.get("id") != id_:
+            return False
+        if classes:
+            own = WidgetRegistry.classes(tag)
+            if any(cls not in own for cls in classes):
+                return False
+        for attr,value in attrs:
+            actual = tag.get(attr)
+            if actual is None:
+                return False
+            if value is not None and (" ".join(actual) if isinstance(actual,list) else actual) != value:
+                return False
+        return True
+
+    def candidates(self,compound):
+        """the smallest index that every match of the compound must be in"""
+        name,id_,classes,attrs = compound
+        if id_ is not None:
+            return self.by_id.get(id_,{})
+        for attr,value in attrs:
+            if attr == "name" and value is not None:
+                return self.by_name.get(value,{})
+        options = [self.by_class.get(cls,{}) for cls in classes]
+        if name is not None:
+            options.append(self.by_tag.get(name,{}))
+        return min(options,key=len) if options else self.nodes
+
+    def _matches_ancestors(self,node,alternative,step):
+        """checks the steps left of step against node's ancestors, right to left"""
+        if step == len(alternative):
+            return True
+        combinator = alternative[step-1][0]
+        compound = alternative[step][1]
+        parent = node.parent
+        while parent is not None:
+            if WidgetRegistry.matches(parent,compound) and self._matches_ancestors(parent,alternative,step+1):
+                return True
+            if combinator == ">":
+                return False
+            parent = parent.parent
+        return False
+
+    def query(self,selector):
+        """returns the Nodes that match the selector, in the order they were built"""
+        found = {}
+        for alternative in self.parse(selector):
+            compound = alternative[0][1]
+            for node in list(self.candidates(compound)):
+                if node not in found and WidgetRegistry.matches(node,compound) and self._matches_ancestors(node,alternative,1):
+                    found[node] = None
+        """the indexes are only in build order until a retagged node is re-indexed at their ends, so the matches are put back in it"""
+        if self.stale:
+            self.renumber()
+        return sorted(found,key=lambda node: node.sequence)
+
+    def renumber(self):
+        """numbers the nodes in page order again, after patching built or moved some of them"""
+        self.stale = False
+        if self.root is None:
+            return
+        stack = [self.root]
+        sequence = 0
+        while stack:
+            node = stack.pop()
+            sequence += 1
+            node.sequence = sequence
+            stack.extend(reversed(node.children))
+        self._sequence = sequence
+
 class Field():
     def __init__(self, ftype, name, data):
         self.ftype = ftype
@@ -171,11 +2297,509 @@ class Field():
     def __str__(self):
         return str([self.ftype,self.name,self.data])
 
+class TkToolkit():
+    """TkToolkit is the set of widget and variable classes a Window builds with, these are tkinter's"""
+    headless = False
+    Tk = tk.Tk
+    Toplevel = tk.Toplevel
+    Frame = tk.Frame
+    Label = tk.Label
+    Button = tk.Button
+    Entry = tk.Entry
+    Listbox = tk.Listbox
+    Scrollbar = tk.Scrollbar
+    Canvas = tk.Canvas
+    Checkbutton = tk.Checkbutton
+    Radiobutton = tk.Radiobutton
+    PhotoImage = tk.PhotoImage
+    StringVar = tk.StringVar
+    IntVar = tk.IntVar
+    VirtualListbox = VirtualListbox
+    VirtualScrollFrame = VirtualScrollFrame
+    Text = tk.Text
+    LogView = LogView
+
+class LayoutWidget():
+    """LayoutWidget is a widget in a headless layout tree, it records what it was created with and how it was placed instead of drawing anything"""
+    """It has the parts of the tkinter widget interface that Window uses, widgets are named the way tkinter names them so paths stay stable between builds"""
+    kind = "Widget"
+
+    def __init__(self,master=None,cnf=None,**options):
+        self.master = master
+        self.options = dict(cnf or {},**options)
+        """child name -> widget, in creation order, and the packed children in packing order"""
+        self.children = {}
+        self._packed = []
+        self._counts = {}
+        self.placement = None
+        self.bindings = {}
+        """listbox items, or canvas items by id"""
+        self.items = []
+        self.selection = set()
+        self.destroyed = False
+        if master is None:
+            self.tk = HeadlessToolkit.interp()
+            """every headless toplevel is its own tree, so they all get the same name and a page gets the same paths however many were built before it"""
+            self._w = "." if self.kind == "Tk" else f".!{self.kind.lower()}"
+            self._after = {}
+            self._after_count = 0
+        else:
+            self.tk = master.tk
+            count = master._counts.get(self.kind,0)+1
+            master._counts[self.kind] = count
+            name = f"!{self.kind.lower()}{count if count > 1 else ''}"
+            self._w = (master._w if master._w != "." else "")+"."+name
+            master.children[name] = self
+            """counted the same way BuildProfiler counts Tk widgets, so headless profiles show what a build creates"""
+            if PROFILER is not None:
+                PROFILER.widgets_created += 1
+
+    def __str__(self):
+        return self._w
+
+    def _root(self):
+        widget = self
+        while widget.master is not None:
+            widget = widget.master
+        return widget
+
+    def configure(self,cnf=None,**options):
+        self.options.update(cnf or {},**options)
+    config = configure
+
+    def __setitem__(self,key,value):
+        self.options[key] = value
+
+    def __getitem__(self,key):
+        return self.options.get(key,"")
+    cget = __getitem__
+
+    def grid(self,cnf=None,**options):
+        self.placement = ("grid",dict(cnf or {},**options))
+    grid_configure = grid
+
+    def grid_info(self):
+        return dict(self.placement[1]) if self.placement and self.placement[0] == "grid" else {}
+
+    def grid_forget(self):
+        self.placement = None
+
+    def pack(self,cnf=None,**options):
+        options = dict(cnf or {},**options)
+        after = options.pop("after",None)
+        packed = self.master._packed
+        if self in packed:
+            packed.remove(self)
+        packed.insert(packed.index(after)+1 if after in packed else len(packed),self)
+        self.placement = ("pack",options)
+
+    def pack_forget(self):
+        if self in self.master._packed:
+            self.master._packed.remove(self)
+        self.placement = None
+
+    def bind(self,sequence,func=None,add=None):
+        self.bindings.setdefault(sequence,[]).append(func)
+        return sequence
+
+    def destroy(self):
+        for child in list(self.children.values()):
+            child.destroy()
+        self.destroyed = True
+        if self.master is not None:
+            self.master.children.pop(self._w.rsplit(".",1)[-1],None)
+            if self in self.master._packed:
+                self.master._packed.remove(self)
+
+    def winfo_children(self):
+        return list(self.children.values())
+
+    def winfo_exists(self):
+        return 0 if self.destroyed else 1
+
+    def winfo_ismapped(self):
+        return 0
+
+    def winfo_width(self):
+        return int(self.options.get("width",1) or 1)
+
+    def winfo_height(self):
+        return int(self.options.get("height",1) or 1)
+
+    def winfo_rootx(self):
+        return 0
+
+    def winfo_rooty(self):
+        return 0
+
+    def winfo_toplevel(self):
+        return self._root()
+
+    """listboxes"""
+    def insert(self,index,*items):
+        position = len(self.items) if index == tk.END else int(index)
+        self.items[position:position] = items
+
+    def delete(self,first,last=None):
+        if self.kind == "Canvas":
+            self.items = [item for item in self.items if item["id"] != first]
+            return
+        first = int(first)
+        last = len(self.items)-1 if last == tk.END else (first if last is None else int(last))
+        del self.items[first:last+1]
+
+    def get(self,first,last=None):
+        if last is None:
+            return self.items[int(first)]
+        return tuple(self.items[int(first):(len(self.items) if last == tk.END else int(last)+1)])
+
+    def size(self):
+        return len(self.items)
+
+    def curselection(self):
+        return tuple(sorted(self.selection))
+
+    def selection_set(self,first,last=None):
+        self.selection.update(range(int(first),int(last if last is not None else first)+1))
+
+    def selection_clear(self,first,last=None):
+        self.selection.clear()
+
+    def activate(self,index):
+        pass
+
+    def see(self,index):
+        pass
+
+    def yview(self,*args):
+        return (0.0,1.0) if not args else None
+
+    def set(self,first,last):
+        """scrollbars"""
+        pass
+
+    """canvases"""
+    def _create(self,kind,coords,options):
+        item = {"id":len(self.items)+1,"type":kind,"coords":list(coords),"options":options}
+        self.items.append(item)
+        return item["id"]
+
+    def create_window(self,*coords,**options):
+        return self._create("window",coords,options)
+
+    def create_image(self,*coords,**options):
+        return self._create("image",coords,options)
+
+    def create_rectangle(self,*coords,**options):
+        return self._create("rectangle",coords,options)
+
+    def itemconfigure(self,item,**options):
+        for entry in self.items:
+            if entry["id"] == item:
+                entry["options"].update(options)
+
+    def coords(self,item,*coords):
+        for entry in self.items:
+            if entry["id"] == item:
+                entry["coords"] = list(coords)
+
+    def bbox(self,*tags):
+        return None
+
+    def canvasy(self,y):
+        return y
+
+    """toplevels, callbacks are only run by update()"""
+    def after(self,ms,func=None,*args):
+        root = self._root()
+        root._after_count += 1
+        after_id = f"after#{root._after_count}"
+        root._after[after_id] = (func,args)
+        return after_id
+
+    def after_idle(self,func,*args):
+        return self.after(0,func,*args)
+
+    def after_cancel(self,after_id):
+        self._root()._after.pop(after_id,None)
+
+    def update(self):
+        """runs the callbacks waiting in after() and after_idle()"""
+        root = self._root()
+        callbacks,root._after = root._after,{}
+        for func,args in callbacks.values():
+            func(*args)
+    update_idletasks = update
+
+    def title(self,text=None):
+        if text is None:
+            return self.options.get("title","")
+        self.options["title"] = text
+
+    def geometry(self,text=None):
+        if text is None:
+            return self.options.get("geometry","")
+        self.options["geometry"] = text
+
+    def protocol(self,name=None,func=None):
+        pass
+
+    def transient(self,master=None):
+        pass
+
+    def grab_set(self):
+        pass
+
+    def focus_set(self):
+        pass
+
+    def withdraw(self):
+        self.options["state"] = "withdrawn"
+
+    def deiconify(self):
+        self.options.pop("state",None)
+
+    def lift(self):
+        pass
+
+    def grab_release(self):
+        pass
+
+    def quit(self):
+        pass
+
+    def mainloop(self,n=0):
+        pass
+
+    def snapshot(self):
+        """returns the widget and everything inside it as plain data, for comparing builds"""
+        snapshot = {"type":self.kind,"path":self._w}
+        if self.options:
+            snapshot["options"] = {key:LayoutWidget._plain(value) for key,value in sorted(self.options.items())}
+        if self.placement is not None:
+            snapshot[self.placement[0]] = {key:LayoutWidget._plain(value) for key,value in sorted(self.placement[1].items())}
+        if self.items:
+            snapshot["items"] = [LayoutWidget._plain(item) for item in self.items]
+        if self.bindings:
+            snapshot["bindings"] = sorted(self.bindings)
+        children = self._packed+[child for child in self.children.values() if child not in self._packed]
+        if children:
+            snapshot["children"] = [child.snapshot() for child in children]
+        return snapshot
+
+    @staticmethod
+    def _plain(value):
+        """options hold variables, images, widgets and callbacks, they are replaced with something that is the same from one build to the next"""
+        if isinstance(value,(str,int,float,bool)) or value is None:
+            return value
+        if isinstance(value,dict):
+            return {key:LayoutWidget._plain(v) for key,v in value.items()}
+        if isinstance(value,(list,tuple)):
+            return [LayoutWidget._plain(v) for v in value]
+        if isinstance(value,tk.Variable):
+            return f"<{type(value).__name__}>"
+        if isinstance(value,LayoutImage):
+            return {"image":value.src if isinstance(value.src,str) else "blob","size":[value.width(),value.height()]}
+        if isinstance(value,LayoutWidget):
+            return value._w
+        if callable(value):
+            return "<command>"
+        return repr(value)
+
+class LayoutImage():
+    """LayoutImage stands in for a PhotoImage in a headless layout tree, it only knows its source and size"""
+    def __init__(self,master=None,width=0,height=0,src=None,**options):
+        self.src = src
+        self._size = (int(width),int(height))
+
+    def width(self):
+        return self._size[0]
+
+    def height(self):
+        return self._size[1]
+
+class LayoutVirtualListbox(LayoutWidget):
+    """a VirtualListbox in a headless layout tree, it records how many rows its provider has"""
+    kind = "VirtualListbox"
+    def __init__(self,master,provider,height=10,width=20,selectmode=tk.BROWSE):
+        super().__init__(master,height=height,width=width,selectmode=selectmode,rows=len(provider))
+        self.provider = provider
+        self.listbox = self
+
+    def set_provider(self,provider):
+        self.provider = provider
+        self.options["rows"] = len(provider)
+
+    def refresh(self):
+        pass
+
+    def get_selection(self):
+        return sorted(self.selection)
+
+    def get_selected_items(self):
+        return [self.provider[i:i+1][0] for i in sorted(self.selection)]
+
+class LayoutVirtualScrollFrame(LayoutWidget):
+    """a VirtualScrollFrame in a headless layout tree, its rows aren't built since none of them are ever visible"""
+    kind = "VirtualScrollFrame"
+    def __init__(self,master,window,rows,rowheight=24,height=200,width=200,overscan=2):
+        super().__init__(master,height=height,width=width,rowheight=rowheight)
+        self.window = window
+        self.set_rows(rows)
+
+    def set_rows(self,rows):
+        self.rows = list(rows)
+        self.options["rows"] = len(self.rows)
+
+    def update_rows(self):
+        pass
+
+class LayoutLogView(LayoutWidget):
+    """a LogView in a headless layout tree, lines go straight into its ring buffer"""
+    kind = "LogView"
+    def __init__(self,master,height=20,width=80,maxlines=10000,autoscroll=True,filter=None):
+        super().__init__(master,height=height,width=width,maxlines=maxlines,autoscroll=autoscroll,filter=filter if isinstance(filter,str) else None)
+        self.buffer = deque(maxlen=maxlines)
+        self._partial = ""
+
+    def append(self,line):
+        self.buffer.extend(str(line).split("\n"))
+
+    def extend(self,lines):
+        self.buffer.extend(part for line in lines for part in str(line).split("\n"))
+
+    def write(self,text):
+        lines = (self._partial+text).split("\n")
+        self._partial = lines.pop()
+        self.buffer.extend(lines)
+        return len(text)
+
+    def flush(self):
+        pass
+
+    def set_filter(self,filter):
+        self.options["filter"] = filter if isinstance(filter,str) else None
+
+    def clear(self):
+        self.buffer.clear()
+
+def _layout_class(name):
+    return type(name,(LayoutWidget,),{"kind":name,"__doc__":f"a {name} in a headless layout tree"})
+
+class HeadlessToolkit():
+    """HeadlessToolkit builds pages into trees of LayoutWidgets, so pages can be built and checked without Tk or a display"""
+    """The same BODY_ACTIONS run, and Form variables are real Tcl variables on a Tcl interpreter without Tk, so Form fields, traces and snapshots work as usual"""
+    """Images only have their headers read, and builds are never batched, progressive or async since there is nothing to draw"""
+    headless = True
+    Tk = _layout_class("Tk")
+    Toplevel = _layout_class("Toplevel")
+    Frame = _layout_class("Frame")
+    Label = _layout_class("Label")
+    Button = _layout_class("Button")
+    Entry = _layout_class("Entry")
+    Listbox = _layout_class("Listbox")
+    Scrollbar = _layout_class("Scrollbar")
+    Canvas = _layout_class("Canvas")
+    Checkbutton = _layout_class("Checkbutton")
+    Radiobutton = _layout_class("Radiobutton")
+    PhotoImage = LayoutImage
+    VirtualListbox = LayoutVirtualListbox
+    VirtualScrollFrame = LayoutVirtualScrollFrame
+    Text = _layout_class("Text")
+    LogView = LayoutLogView
+    _interp = None
+
+    @staticmethod
+    def interp():
+        """the Tcl interpreter every headless window in the process shares"""
+        if HeadlessToolkit._interp is None:
+            HeadlessToolkit._interp = tk.Tcl()
+        return HeadlessToolkit._interp
+
+    @staticmethod
+    def StringVar(master=None,value=None,name=None):
+        return tk.StringVar(master=HeadlessToolkit.interp(),value=value,name=name)
+
+    @staticmethod
+    def IntVar(master=None,value=None,name=None):
+        return tk.IntVar(master=HeadlessToolkit.interp(),value=value,name=name)
+
+    @staticmethod
+    def image(src,target_size=250,mode='path'):
+        """a LayoutImage the size TagUtility.resize_image would make the image"""
+        width,height = TagUtility.image_size(src,target_size,mode)
+        return LayoutImage(width=width,height=height,src=src)
+
+    @staticmethod
+    def build_page(path,window=None):
+        """builds the page at path headless and returns the window's layout snapshot, or {"error":message} if it couldn't be built"""
+        window = window if window else Window
+        try:
+            w = window(TagUtility.get_cached_html(path),main=True,toolkit=HeadlessToolkit)
+            snapshot = w.layout_snapshot()
+            w.destroy()
+            return snapshot
+        except Exception as e:
+            return {"error":f"{type(e).__name__}: {e}"}
+
+    @staticmethod
+    def build_pages(paths,window=None,max_workers=None,chunksize=16):
+        """builds many pages headless in worker processes, returns path -> layout snapshot"""
+        """window is the Window class to build them with, it has to be importable by the workers"""
+        from concurrent.futures import ProcessPoolExecutor
+        from functools import partial
+        paths = list(paths)
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            return dict(zip(paths,executor.map(partial(HeadlessToolkit.build_page,window=window),paths,chunksize=chunksize)))
+
+    @staticmethod
+    def diff(old,new,path=""):
+        """returns the differences between two layout snapshots, as a list of "where: old -> new" lines"""
+        if type(old) != type(new):
+            return [f"{path}: {old!r} -> {new!r}"]
+        if isinstance(old,dict):
+            differences = []
+            for key in list(old)+[key for key in new if key not in old]:
+                where = f"{path}.{key}" if path else str(key)
+                if key not in new:
+                    differences.append(f"{where}: {old[key]!r} -> missing")
+                elif key not in old:
+                    differences.append(f"{where}: missing -> {new[key]!r}")
+                else:
+                    differences.extend(HeadlessToolkit.diff(old[key],new[key],where))
+            return differences
+        if isinstance(old,list):
+            differences = []
+            for i,(a,b) in enumerate(zip(old,new)):
+                differences.extend(HeadlessToolkit.diff(a,b,f"{path}[{i}]"))
+            for i in range(len(new),len(old)):
+                differences.append(f"{path}[{i}]: {old[i]!r} -> missing")
+            for i in range(len(old),len(new)):
+                differences.append(f"{path}[{i}]: missing -> {new[i]!r}")
+            return differences
+        return [] if old == new else [f"{path}: {old!r} -> {new!r}"]
+
 class Window():
     """Window Base class, handles the psarsing of HTML text into tkinter widgets"""
     """Subclasses of Window will implement their own post() method, which handles some extra initializing of the window and input from forms"""
     client = None
-    def __init__(self,soup=None,path=None,main=False,master=None,form=None,button=None,windows=None):
+    """Every Window that hasn't been garbage collected, for leak_report"""
+    _windows = weakref.WeakSet()
+    """Prefetcher shared by all windows, prefetching is off until one is set with set_prefetcher"""
+    prefetcher = None
+    """Navigator that keeps visited pages alive, links open a new window every time until one is set with set_navigator"""
+    navigator = None
+    """Progressive builds build the first first_screen elements right away, and the rest in chunks of frame_budget seconds so the window can paint and respond in between"""
+    progressive = False
+    first_screen = 40
+    frame_budget = 0.012
+    """Batched builds turn the page into one Tcl script and evaluate it with a single tk.eval, progressive builds take priority over it"""
+    batched = False
+    """With async_images, images and image buttons are built with placeholders and their images are decoded by an ImageLoader in the background"""
+    async_images = False
+    """The widget classes the window builds with, HeadlessToolkit builds a LayoutWidget tree instead of Tk widgets"""
+    toolkit = TkToolkit
+    def __init__(self,soup=None,path=None,main=False,master=None,form=None,button=None,windows=None,progressive=None,batched=None,async_images=None,toolkit=None):
         """the functions to call for each tag type"""
         self.HEAD_ACTIONS = {
             "title":self.set_title,
@@ -194,18 +2818,80 @@ class Window():
             "input":self.create_input,
             "select":self.create_select,
             "option":self.create_option,
+            "repeat":self.create_repeat,
+            "logview":self.create_logview,
+            "textarea":self.create_textarea,
         }
 
+        """the functions to call to reconfigure an already built widget for a new version of its tag"""
+        self.PATCH_ACTIONS = {
+            "button":self.patch_button,
+            "label":self.patch_label,
+            "div":self.patch_frame,
+        }
+
+        """the functions to call for each tag type in a batched build, and the Window method a subclass must not have overridden for them to be used"""
+        self.BATCH_ACTIONS = {
+            "button":(self.batch_button,"create_button"),
+            "label":(self.batch_label,"create_label"),
+            "div":(self.batch_frame,"create_frame"),
+            "form":(self.batch_frame,"create_form"),
+            "input":(self.batch_input,"create_input"),
+            "listbox":(self.batch_listbox,"create_listbox"),
+            "scrollbox":(lambda *args, **kwargs: self.batch_listbox(scrolling=True,*args,**kwargs),"create_listbox"),
+        }
+        self._default_body_actions = dict(self.BODY_ACTIONS)
+
+        """Dictionary for the Repeat of each <repeat> tag, by its id or source"""
+        self.repeats = {}
         """Dictionary for buttons"""
         self.buttons = {}
         """If a button class type was passed use that, if not then use the defualt Button"""
         self.button = button if button else Button
         """List for images, PIL Tkimages will get garbage collected if the last reference goes out of scope so we will keep them here"""
         self.images = []
+        """IMAGE_CACHE keys for the images, so they can be released when the window is destroyed"""
+        self._image_keys = []
+        self.destroyed = False
+        self._leak_check = None
+        Window._windows.add(self)
         """If a button form type was passed use that, if not then use the defualt Form"""
         self.form_type = form if form else Form
+        self.form = None
         """Dictionary for the forms and lists so we can add items to them later"""
         self.frames = {}
+        """The tree of Nodes for what was built from the body, and the node currently being built"""
+        self.root_node = None
+        self._node = None
+        """Every Node in the tree indexed by id, name, tag and class, for query()"""
+        self.registry = WidgetRegistry()
+        """ActionRunner for buttons that run in the background, it's created the first time one is clicked"""
+        self.runner = None
+        if progressive is not None:
+            self.progressive = progressive
+        if batched is not None:
+            self.batched = batched
+        if async_images is not None:
+            self.async_images = async_images
+        if toolkit is not None:
+            self.toolkit = toolkit
+        if self.toolkit.headless:
+            self.progressive = self.batched = self.async_images = False
+        """ImageLoader for async_images, it's created for the first image, and the blank placeholder images by size"""
+        self.image_loader = None
+        self._placeholders = {}
+        """The Tcl script being built during a batched build, and the Tcl commands batched widgets call back into Python with"""
+        self._batch = None
+        self._batch_count = 0
+        """functions that need the batched widgets to exist in Tcl, they run after the script is evaluated"""
+        self._after_batch = []
+        self._click_command = None
+        self._submit_command = None
+        """The stack of body elements still waiting to be built during a progressive build, and the callbacks to run once they are"""
+        self._pending = None
+        self._pump_id = None
+        self._on_built = []
+        self.built = False
         """Types of windows for linked windows"""
         self.windows = windows
         self.isMain = main
@@ -214,16 +2900,20 @@ class Window():
  
         """self.win is the toplevel tkinter widget for all the widgets in the window"""
         if main:
-            self.win = tk.Tk()
+            self.win = self.toolkit.Tk()
             self.win.protocol("WM_DELETE_WINDOW", self.shut_down)
         else:
-            self.win = tk.Toplevel()
+            self.win = self.toolkit.Toplevel()
             self.win.transient(master=master)
             self.win.grab_set()
             self.win.focus_set()
+            """closing the window with the window manager cleans up the same way the back button does"""
+            self.win.protocol("WM_DELETE_WINDOW", lambda: self.back_button(None))
 
         """have one main frame for all the tkinter widgets to sit in"""
-        self.main_frame = tk.Frame(self.win)
+        self.main_frame = self.toolkit.Frame(self.win)
+        """LayoutScheduler that the scrolling divs recompute their scrollregions through, once per frame"""
+        self.layout = LayoutScheduler(self.win)
 
         if soup is None and path is not None:
             #if we were given a path and not a soup, get the soup from the file at the path
@@ -240,11 +2930,14 @@ class Window():
         """starts the mainloop"""
         self.win.mainloop()
 
-    def _initialize(self):
+    def _initialize(self,on_complete=None):
         """This is where we actually start the process of converting all the HTML tags in the soup to tkinter widgets"""
+        """on_complete is called once every element has been built, which is later on for progressive builds"""
 
         """instantiate a new form for the window"""
         self.form = self.form_type(window=self)
+        if on_complete:
+            self.when_built(on_complete)
         """Buitld the elements"""
         self.buildElements()
         """grid the main frame so we can see all the widgets"""
@@ -252,7 +2945,7 @@ class Window():
 
     def _initPath(self,path):
         # get the soup from the file at the path
-        self.soup = TagUtility.get_html(path)
+        self.soup = TagUtility.get_cached_html(path)
 
     def shut_down(self):
         """handle the closing of the GUI"""
@@ -263,23 +2956,288 @@ class Window():
         self._initialize()   
 
     def buildElements(self):
+        self.root_node = Node(None,self.main_frame)
+        self.registry.root = self.root_node
+        self._node = self.root_node
+        """layout waits until everything is built, a progressive build lets it run between its chunks"""
+        self.layout.pause()
         self.buildHead(self.soup.head)
+        if not self.progressive:
+            if self.batched:
+                self._batch = []
+            self.buildBody(self.soup.body,self.main_frame)
+            if self.batched:
+                self.flush_batch()
+                self._batch = None
+                """the batched variables are set after their traces are added, so those writes don't count as changes"""
+                self.form.mark_clean()
+            self.layout.resume()
+            self._build_finished()
+            return
+        self._pending = []
         self.buildBody(self.soup.body,self.main_frame)
+        for _ in range(self.first_screen):
+            if not self._build_step():
+                break
+        self.layout.resume()
+        if self._pending:
+            self._pump_id = self.win.after_idle(self._pump)
+        else:
+            self._build_finished()
+
+    def _build_step(self):
+        """builds the next element waiting in a progressive build, returns False when there are none left"""
+        while self._pending:
+            elements,container,args,kwargs,parent,results = self._pending[-1]
+            tag = next(elements,None)
+            if tag is None:
+                self._pending.pop()
+            elif tag.name is not None:
+                self._node = parent
+                results.append(self._build_tag(tag,container,args,kwargs).element)
+                return True
+        return False
+
+    def _pump(self):
+        """builds elements until the frame budget runs out, then gives tkinter a chance to paint and handle input"""
+        self._pump_id = None
+        deadline = time.perf_counter()+self.frame_budget
+        while self._build_step():
+            if time.perf_counter() >= deadline:
+                self._pump_id = self.win.after(1,self._pump)
+                return
+        self._build_finished()
+
+    def _build_finished(self):
+        self._pending = None
+        self._node = None
+        self.built = True
+        if Window.prefetcher is not None:
+            Window.prefetcher.prefetch([b.link for b in self.buttons.values() if b.btype == "link" and b.link])
+        callbacks,self._on_built = self._on_built,[]
+        for callback in callbacks:
+            callback()
+
+    def finish_build(self):
+        """builds everything that is still waiting in a progressive build right now"""
+        if self._pending is None:
+            return
+        if self._pump_id is not None:
+            self.win.after_cancel(self._pump_id)
+            self._pump_id = None
+        while self._build_step():
+            pass
+        self._build_finished()
+
+    def when_built(self,callback):
+        """calls callback once the whole page has been built, straight away if it already has been"""
+        if self.built:
+            callback()
+        else:
+            self._on_built.append(callback)
 
     def buildHead(self,soup):
         """Build the header elements, or metadata"""
         for tag in soup:
             if tag.name is not None:
-                self.HEAD_ACTIONS[tag.name](tag)
+                if PROFILER is None:
+                    self.HEAD_ACTIONS[tag.name](tag)
+                else:
+                    with PROFILER.span("head",tag.name,None,self.win):
+                        self.HEAD_ACTIONS[tag.name](tag)
 
     def buildBody(self,data,container,*args,**kwargs):
         """build the body elements, or the stuff we actially see"""
         elements = []
+        if self._pending is not None:
+            """in a progressive build the elements are queued, and the list gets filled in as they are built"""
+            self._pending.append((iter(data),container,args,kwargs,self._node,elements))
+            return elements
         for tag in data:
             if tag.name is not None:
-                elements.append(self.BODY_ACTIONS[tag.name](tag,container,*args,**kwargs))
+                elements.append(self._build_tag(tag,container,args,kwargs).element)
         return elements
 
+    def _build_tag(self,tag,container,args=(),kwargs=None):
+        """builds one tag with its BODY_ACTIONS function and records it as a Node under the node being built"""
+        kwargs = kwargs if kwargs else {}
+        parent = self._node
+        node = Node(tag,container,parent,args,kwargs)
+        if parent is not None:
+            parent.children.append(node)
+            if not node.detached:
+                self.registry.add(node)
+        self._node = node
+        action = self.BODY_ACTIONS[tag.name]
+        if self._batch is not None:
+            action = self._batch_action(tag,action)
+        try:
+            if PROFILER is None:
+                node.element = action(tag,container,*args,**kwargs)
+            else:
+                with PROFILER.span("body",tag.name,TagUtility.get_attribute(tag,"id") or TagUtility.get_attribute(tag,"name"),self.win):
+                    node.element = action(tag,container,*args,**kwargs)
+        finally:
+            self._node = parent
+        return node
+
+    def _batch_action(self,tag,action):
+        """returns the batch function for a tag if it can be batched, otherwise runs the script so far so the normal function sees every widget before it"""
+        batch = self.BATCH_ACTIONS.get(tag.name)
+        if batch is not None and action is self._default_body_actions.get(tag.name)\
+         and getattr(type(self),batch[1]) is getattr(Window,batch[1]) and self._can_batch(tag):
+            return batch[0]
+        self.flush_batch()
+        return action
+
+    def _can_batch(self,tag):
+        """checks the parts of a tag that the batch functions don't handle"""
+        if tag.name == "label":
+            return not TagUtility.get_attribute(tag,"for")
+        if tag.name == "button":
+            return len(tag.find_all("img")) == 0
+        if tag.name == "div":
+            return not TagUtility.get_attribute(tag,"scrolling",TagUtility.bool_from_str)
+        if tag.name == "input":
+            kind = TagUtility.get_attribute(tag,"type")
+            return kind in ("text","submit") and INPUT_TYPE_ACTIONS[kind] is getattr(Window,f"create_{kind}_input")
+        if tag.name in ("listbox","scrollbox"):
+            return not TagUtility.get_attribute(tag,"provider")
+        return True
+
+    def flush_batch(self):
+        """evaluates the Tcl script built so far in one round trip"""
+        if self._batch:
+            script = "\n".join(self._batch)
+            self._batch = []
+            self.win.tk.eval(script)
+        callbacks,self._after_batch = self._after_batch,[]
+        for callback in callbacks:
+            callback()
+
+    def after_batch(self,callback):
+        """calls callback once the widgets batched so far exist in Tcl, right away if the window isn't batching"""
+        if self._batch is None:
+            callback()
+        else:
+            self._after_batch.append(callback)
+
+    def _batch_widget(self,cls,parent,options):
+        """makes the Python object for a widget the script will create, without calling into Tcl, and adds the line that creates it"""
+        name = f"b{self._batch_count}"
+        self._batch_count += 1
+        widget = cls.__new__(cls)
+        widget.widgetName = cls.__name__.lower()
+        widget.master = parent
+        widget.tk = parent.tk
+        widget._name = name
+        widget._w = "."+name if parent._w == "." else parent._w+"."+name
+        widget.children = {}
+        widget._tclCommands = []
+        parent.children[name] = widget
+        if PROFILER is not None:
+            PROFILER.widgets_created += 1
+        self._batch.append(" ".join([widget.widgetName,widget._w]+[f"-{k} {TagUtility.tcl_quote(v)}" for k,v in options.items() if v is not None]))
+        return widget
+
+    def _batch_grid(self,widget,args):
+        self._batch.append(" ".join(["grid","configure",widget._w]+[f"-{k} {TagUtility.tcl_quote(v)}" for k,v in args.items()]))
+
+    def _batch_variable(self,cls,value):
+        """makes the Python object for a Tcl variable the script will set"""
+        var = cls.__new__(cls)
+        var._root = self.win._root()
+        var._tk = self.win.tk
+        var._name = f"PY_VARb{id(self)}_{self._batch_count}"
+        self._batch_count += 1
+        self._batch.append(f"set {var._name} {TagUtility.tcl_quote(value)}")
+        return var
+
+    def batch_label(self,label,parent):
+        """batched version of create_label"""
+        l = self._batch_widget(tk.Label,parent,{"text":label.text.strip()})
+        ltype = TagUtility.get_attribute(label,"type")
+        if ltype and ltype == "display":
+            tksv = self._batch_variable(tk.StringVar,"")
+            self._batch.append(f"{l._w} configure -textvariable {tksv._name}")
+            self.form.add_field(Field("label",TagUtility.get_attribute(label,"name"),tksv))
+        self._batch_grid(l,TagUtility.get_grid_args(label))
+        return l
+
+    def batch_button(self,button,parent):
+        """batched version of create_button, every button shares one Tcl command for its clicks"""
+        if self._click_command is None:
+            self._click_command = self.win.register(self._button_clicked)
+        b = self._batch_widget(tk.Button,parent,{"text":button.text.strip()})
+        self._batch_grid(b,TagUtility.get_grid_args(button))
+        self._register_button(b,button)
+        self._batch.append(f"bind {b._w} <Button-1> {{{self._click_command} %W}}")
+        return b
+
+    def batch_frame(self,frame,parent,*args,**kwargs):
+        """batched version of create_frame and create_form"""
+        tk_frame = self._batch_widget(tk.Frame,parent,{})
+        elements = self.buildBody(frame,tk_frame,*args,**kwargs)
+        self._batch_grid(tk_frame,TagUtility.get_grid_args(frame))
+        frame_id = TagUtility.get_attribute(frame,"id")
+        if not frame_id:
+            frame_id = str(tk_frame)
+        self._add_frame(frame_id,tk_frame)
+        return (tk_frame,elements)
+
+    def batch_input(self,input_tag,parent):
+        """batched version of create_text_input and create_submit_input"""
+        if TagUtility.get_attribute(input_tag,"type") == "submit":
+            if self._submit_command is None:
+                self._submit_command = self.win.register(lambda: self.form.submit())
+            button = self._batch_widget(tk.Button,parent,{"command":self._submit_command,"text":TagUtility.get_attribute(input_tag,"text",str)})
+            self._batch_grid(button,TagUtility.get_grid_args(input_tag))
+            return button
+        default = TagUtility.get_attribute(input_tag,"default")
+        var = self._batch_variable(tk.StringVar,default if default else "")
+        entry = self._batch_widget(tk.Entry,parent,{"textvariable":var._name,"show":"\u2022" if TagUtility.get_attribute(input_tag,"hidden") else None})
+        self._batch_grid(entry,TagUtility.get_grid_args(input_tag))
+        self.form.add_field(Field(str,TagUtility.get_attribute(input_tag,"name"),var))
+        return entry
+
+    def batch_listbox(self,listbox,parent,scrolling=False):
+        """batched version of create_listbox, all the items go in with one insert"""
+        if TagUtility.get_attribute(listbox,"scrolling",TagUtility.bool_from_str) or scrolling:
+            frame = self._batch_widget(tk.Frame,parent,{})
+            parent = frame
+            scrolling = True
+        tk_listbox = self._batch_widget(tk.Listbox,parent,TagUtility.get_listbox_args(listbox))
+        list_items = [item.text for item in listbox.find_all("li")]
+        if list_items:
+            self._batch.append(" ".join([tk_listbox._w,"insert","end"]+[TagUtility.tcl_quote(item) for item in list_items]))
+
+        list_id = TagUtility.get_attribute(listbox,"id")
+        if not list_id:
+            list_id = str(tk_listbox)
+        self._add_frame(list_id,tk_listbox)
+        if self.form:
+            self.form.add_field(Field("listbox",TagUtility.get_attribute(listbox,"name"),[tk_listbox,list_items]))
+
+        if scrolling:
+            scrollbar = self._batch_widget(tk.Scrollbar,frame,{"orient":tk.VERTICAL,"command":f"{tk_listbox._w} yview"})
+            self._batch_grid(scrollbar,{"row":0,"column":1,"sticky":tk.N+tk.S})
+            self._batch.append(f"{tk_listbox._w} configure -yscrollcommand {TagUtility.tcl_quote(scrollbar._w+' set')}")
+            self._batch_grid(tk_listbox,{"row":0,"column":0,"sticky":tk.N+tk.S+tk.E+tk.W})
+            self._batch_grid(frame,TagUtility.get_grid_args(listbox))
+            return frame
+        self._batch_grid(tk_listbox,TagUtility.get_grid_args(listbox))
+        return tk_listbox
+
+    def field_added(self,field):
+        """called by the Form when a field is added, so the node being built knows which fields belong to it"""
+        if self._node is not None:
+            self._node.fields.append(field)
+
+    def option_added(self,field,data):
+        """called by the Form when an option is added to a multiple select, so the option's node can take it out again"""
+        if self._node is not None:
+            self._node.options.append((field,data))
+
     def buildList(self,elements,listbox):
         """accepts the elements for a listbox, and the listbox to add them to, and adds them"""
         l = [item.text for item in elements.find_all("li")]
@@ -295,7 +3253,7 @@ class Window():
 
     def create_label(self,label,parent):
         """Creates a tk.Label from the html soup"""
-        l = tk.Label(parent,text=label.text.strip())
+        l = self.toolkit.Label(parent,text=label.text.strip())
         l.grid(TagUtility.get_grid_args(label))
         if TagUtility.get_attribute(label,"for"):
             name = TagUtility.get_attribute(label,"name")
@@ -304,76 +3262,98 @@ class Window():
         ltype = TagUtility.get_attribute(label,"type")
         if ltype and ltype == "display":
             name = TagUtility.get_attribute(label,"name")
-            tksv =  tk.StringVar()
+            tksv =  self.toolkit.StringVar()
             l["textvariable"] = tksv
             self.form.add_field(Field("label",name,tksv))
         return l
 
     def create_button(self,button,parent):
         """Creates a tk.Button from the html soup"""
-        if len(button.find_all("img")) != 0:
-            icon = TagUtility.get_image(src=button.find_all("img")[0]["src"],target_size=20)
-            b = tk.Button(parent,image=icon,text=button.text.strip(),height=20,width=20)
-            self.images.append(icon)
+        if len(button.find_all("img")) != 0 and self.async_images:
+            b = self.toolkit.Button(parent,image=self.placeholder_image(20,20),text=button.text.strip(),height=20,width=20)
+            self.load_image_async(button.find_all("img")[0]["src"],20,'path',b,lambda icon: b.configure(image=icon))
+        elif len(button.find_all("img")) != 0:
+            icon = self.load_image(button.find_all("img")[0]["src"],target_size=20)
+            b = self.toolkit.Button(parent,image=icon,text=button.text.strip(),height=20,width=20)
         else: 
-            b = tk.Button(parent,text=button.text.strip())
+            b = self.toolkit.Button(parent,text=button.text.strip())
         b.grid(TagUtility.get_grid_args(button))
-        self.buttons[str(b)] = self.button(**TagUtility.get_button_args(button),window=self)
+        self._register_button(b,button)
         b.bind("<Button-1>",self.button_clicked)
         return b
 
+    def _register_button(self,b,button):
+        """creates the Button object for a tk.Button and adds it to the buttons dictionary"""
+        btn = self.button(**TagUtility.get_button_args(button),window=self)
+        btn.widget = b
+        key = str(b)
+        if self._node is not None and key not in self.buttons:
+            self._node.buttons.append(key)
+        self.buttons[key] = btn
+        return btn
+
+    def _add_frame(self,frame_id,frame):
+        """adds a frame to the frames dictionary and records it on the node being built"""
+        if self._node is not None:
+            self._node.frames.append((frame_id,frame))
+        self.frames[frame_id] = frame
+
     def create_frame(self,frame,parent,*args,**kwargs):
         """Creates a tk.Frame from the html soup, and fill it with widgets"""
         if TagUtility.get_attribute(frame,"scrolling",TagUtility.bool_from_str):
+            if TagUtility.get_attribute(frame,"virtual",TagUtility.bool_from_str):
+                return self.create_virtual_scrollframe(frame,parent)
             return self.create_scrollframe(frame,parent,*args,**kwargs)
         else:
-            tk_frame = tk.Frame(parent)
+            tk_frame = self.toolkit.Frame(parent)
             elements = self.buildBody(frame,tk_frame,*args,**kwargs)
             tk_frame.grid(TagUtility.get_grid_args(frame))
             frame_id = TagUtility.get_attribute(frame,"id")
             if not frame_id:
                 """if and ID isn't set, get it from the string cast of the tkinter widget"""
                 frame_id = str(tk_frame)
-            self.frames[frame_id] = tk_frame
+            self._add_frame(frame_id,tk_frame)
             return (tk_frame,elements)
 
 
     def create_form(self,form,parent):
         """create a tk.frame for the Form object, and fill it with widgets"""
-        form_frame = tk.Frame(parent)
+        form_frame = self.toolkit.Frame(parent)
         elements = self.buildBody(form,form_frame)
         form_frame.grid(TagUtility.get_grid_args(form))
         frame_id = TagUtility.get_attribute(form,"id")
         if not frame_id:
             """if and ID isn't set, get it from the string cast of the tkinter widget"""
             frame_id = str(form_frame)
-        self.frames[frame_id] = form_frame
+        self._add_frame(frame_id,form_frame)
         return (form_frame,elements)
 
 
     def create_listbox(self,listbox,parent,scrolling=False):
         """Creates a tk.Listbox from the html soup"""
+        if TagUtility.get_attribute(listbox,"provider"):
+            return self.create_virtual_listbox(listbox,parent)
         if TagUtility.get_attribute(listbox,"scrolling",TagUtility.bool_from_str)\
          or scrolling:
-            frame = tk.Frame(parent)
+            frame = self.toolkit.Frame(parent)
             parent = frame
             scrolling = True
 
-        tk_listbox = tk.Listbox(parent,**TagUtility.get_listbox_args(listbox))
+        tk_listbox = self.toolkit.Listbox(parent,**TagUtility.get_listbox_args(listbox))
         list_items = self.buildList(listbox,tk_listbox)
 
         list_id = TagUtility.get_attribute(listbox,"id")
         if not list_id:
             """if and ID isn't set, get it from the string cast of the tkinter widget"""
             list_id = str(tk_listbox)
-        self.frames[list_id] = tk_listbox
+        self._add_frame(list_id,tk_listbox)
 
         if self.form:
             name = TagUtility.get_attribute(listbox,"name")
             self.form.add_field(Field("listbox",name,[tk_listbox,list_items]))
 
         if scrolling:
-            scrollbar = tk.Scrollbar(frame,orient=tk.VERTICAL)
+            scrollbar = self.toolkit.Scrollbar(frame,orient=tk.VERTICAL)
             scrollbar.grid(row=0,column=1,sticky=tk.N+tk.S)
             tk_listbox['yscrollcommand'] = scrollbar.set
             tk_listbox.grid(row=0,column=0,sticky=tk.N+tk.S+tk.E+tk.W)
@@ -384,15 +3364,35 @@ class Window():
             tk_listbox.grid(TagUtility.get_grid_args(listbox))
             return tk_listbox
 
-            
+
+    def create_virtual_listbox(self,listbox,parent):
+        """Creates a VirtualListbox that reads its rows from the provider named in the html soup"""
+        """the provider is an attribute of the Window subclass, or a method that returns one"""
+        provider = getattr(self,TagUtility.get_attribute(listbox,"provider"))
+        if callable(provider) and not hasattr(provider,"__len__"):
+            provider = provider()
+        vlist = self.toolkit.VirtualListbox(parent,provider,**TagUtility.get_listbox_args(listbox))
+        vlist.grid(TagUtility.get_grid_args(listbox))
+
+        list_id = TagUtility.get_attribute(listbox,"id")
+        if not list_id:
+            """if and ID isn't set, get it from the string cast of the tkinter widget"""
+            list_id = str(vlist)
+        self._add_frame(list_id,vlist)
+
+        if self.form:
+            name = TagUtility.get_attribute(listbox,"name")
+            self.form.add_field(Field("virtual_listbox",name,vlist))
+        return vlist
+
     def create_scrollframe(self,scrollframe,parent,*args,**kwargs):
         """Creates a tk.Frame from the html soup with a scrollbar, and fill it with widgets"""
-        outer_frame = tk.Frame(parent,relief=tk.GROOVE,bd=1)
+        outer_frame = self.toolkit.Frame(parent,relief=tk.GROOVE,bd=1)
         outer_frame.grid(TagUtility.get_grid_args(scrollframe))
 
-        canvas = tk.Canvas(outer_frame,highlightthickness=0)
-        inner_frame = tk.Frame(canvas)
-        scrollbar = tk.Scrollbar(outer_frame,orient=tk.VERTICAL,command=canvas.yview)
+        canvas = self.toolkit.Canvas(outer_frame,highlightthickness=0)
+        inner_frame = self.toolkit.Frame(canvas)
+        scrollbar = self.toolkit.Scrollbar(outer_frame,orient=tk.VERTICAL,command=canvas.yview)
         canvas['yscrollcommand']=scrollbar.set
 
         scrollbar.grid(row=0,column=1,sticky=tk.N+tk.S)
@@ -400,41 +3400,255 @@ class Window():
         canvas.create_window((0,0),window=inner_frame,anchor='nw')
 
 
-        canvas.bind("<Configure>",lambda e: canvas.configure(scrollregion=canvas.bbox("all"),**TagUtility.get_frame_args(scrollframe)))
+        """the frame args are parsed once, and the scrollregion is recomputed at most once per frame however many times the canvas or its contents resize"""
+        frame_args = TagUtility.get_frame_args(scrollframe)
+        canvas.configure(**frame_args)
+        relayout = lambda: canvas.configure(scrollregion=canvas.bbox("all"))
+        canvas.bind("<Configure>",lambda e: self.layout.schedule(canvas,relayout))
+        inner_frame.bind("<Configure>",lambda e: self.layout.schedule(canvas,relayout))
 
         frame_id = TagUtility.get_attribute(scrollframe,"id")
         if not frame_id:
             frame_id = str(inner_frame)
-        self.frames[frame_id] = inner_frame
+        self._add_frame(frame_id,inner_frame)
         outer_frame_id = "outer-"+frame_id
-        self.frames[outer_frame_id] = outer_frame
+        self._add_frame(outer_frame_id,outer_frame)
         canvas_id = frame_id+"-canvas"
-        self.frames[canvas_id] = canvas
+        self._add_frame(canvas_id,canvas)
 
         return (outer_frame,self.buildBody(scrollframe,inner_frame,*args,**kwargs))
 
+    def create_repeat(self,repeat,parent):
+        """Creates a tk.Frame with a row for every item of the source named in the html soup"""
+        """the source is an attribute of the Window subclass, or a method that returns one, it can be any iterable or a generator"""
+        frame = self.toolkit.Frame(parent)
+        frame.grid(TagUtility.get_grid_args(repeat))
+        source = TagUtility.get_attribute(repeat,"source")
+        rep = Repeat(self,repeat,frame,self._node,TagUtility.get_attribute(repeat,"key"))
+        repeat_id = TagUtility.get_attribute(repeat,"id") or source
+        self.repeats[repeat_id] = rep
+        if self._node is not None:
+            self._node.repeats.append((repeat_id,rep))
+        self._add_frame(repeat_id,frame)
+        rep.update(self._repeat_items(source))
+        return (frame,[])
+
+    def _repeat_items(self,source):
+        items = getattr(self,source)
+        return items() if callable(items) else items
+
+    def update_repeat(self,repeat_id,items=None):
+        """re-renders a <repeat> from new items, or from its source again if none are given, reusing the rows whose keys are still there"""
+        rep = self.repeats[repeat_id]
+        if items is None:
+            items = self._repeat_items(TagUtility.get_attribute(rep.node.tag,"source"))
+        rep.update(items)
+
+    def build_under(self,node,data,container,*args,**kwargs):
+        """builds the body elements as children of the given Node"""
+        current = self._node
+        self._node = node
+        try:
+            return self.buildBody(data,container,*args,**kwargs)
+        finally:
+            self._node = current
+
+    def create_virtual_scrollframe(self,scrollframe,parent):
+        """Creates a VirtualScrollFrame from the html soup, each child tag is a row and only the visible rows get widgets"""
+        rows = [tag for tag in scrollframe if tag.name is not None]
+        rowheight = TagUtility.get_attribute(scrollframe,"rowheight",int)
+        vframe = self.toolkit.VirtualScrollFrame(parent,self,rows,rowheight=rowheight if rowheight else 24,**TagUtility.get_frame_args(scrollframe))
+        vframe.grid(TagUtility.get_grid_args(scrollframe))
+
+        frame_id = TagUtility.get_attribute(scrollframe,"id")
+        if not frame_id:
+            frame_id = str(vframe)
+        self._add_frame(frame_id,vframe)
+        return (vframe,[])
+
     def create_image(self,tag,parent):
         """Creates an image from the html soup"""
+        """src is a file, or blob names an attribute of the Window subclass (or a method returning one) holding the image bytes"""
         src = TagUtility.get_attribute(tag,"src")
-        canvas = tk.Canvas(parent)
+        mode = "path"
+        blob = TagUtility.get_attribute(tag,"blob")
+        if blob:
+            src,mode = self._repeat_items(blob),"blob"
+        canvas = self.toolkit.Canvas(parent)
         canvas.grid()
-        img = TagUtility.get_image(src,250)
+        if self.async_images:
+            """a box the size the image will be stands in for it until it has been decoded"""
+            width,height = TagUtility.image_size(src,250,mode)
+            placeholder = canvas.create_rectangle(0,0,width,height,fill="#e0e0e0",outline="")
+            def swap(img):
+                canvas.delete(placeholder)
+                canvas.create_image(0,0,anchor=tk.N+tk.W, image=img)
+            self.load_image_async(src,250,mode,canvas,swap)
+            return canvas
+        img = self.load_image(src,250,mode)
         canvas.create_image(0,0,anchor=tk.N+tk.W, image=img)
-        self.images.append(img)
         return canvas
 
+    def load_image(self,src,target_size=250,mode='path'):
+        """gets an image from the shared IMAGE_CACHE and holds it until the window is destroyed"""
+        if self.toolkit.headless:
+            img = self.toolkit.image(src,target_size,mode)
+            self.images.append(img)
+            return img
+        if PROFILER is None:
+            key,img = IMAGE_CACHE.acquire(src,target_size,mode)
+        else:
+            with PROFILER.span("image",src if mode == "path" else "blob",target_size,self.win):
+                key,img = IMAGE_CACHE.acquire(src,target_size,mode)
+        self._image_keys.append(key)
+        self.images.append(img)
+        return img
+
+    def load_image_async(self,src,target_size,mode,widget,callback):
+        """decodes an image in the background, then calls callback(PhotoImage) on the tkinter thread, the image is held until the window is destroyed"""
+        if self.image_loader is None:
+            self.image_loader = ImageLoader(self)
+        def done(key,img):
+            self._image_keys.append(key)
+            self.images.append(img)
+            callback(img)
+        self.image_loader.request(src,target_size,mode,widget,done)
+
+    def placeholder_image(self,width,height):
+        """a blank image for widgets to show while their own image loads, shared by the widgets of the same size"""
+        if (width,height) not in self._placeholders:
+            self._placeholders[(width,height)] = self.toolkit.PhotoImage(master=self.win,width=width,height=height)
+        return self._placeholders[(width,height)]
+
     def button_clicked(self,event):
         """callback function for when buttons are clicked"""
-        button = self.buttons[str(event.widget)]
+        self._button_clicked(str(event.widget))
+
+    def _button_clicked(self,path):
+        button = self.buttons[path]
+        if button.future is not None:
+            """the button's action is still running in the background"""
+            return
         """call function corresponding to button type"""
-        BUTTON_TYPE_ACTIONS[button.btype](self,button)
-        
+        if PROFILER is None:
+            BUTTON_TYPE_ACTIONS[button.btype](self,button)
+        else:
+            with PROFILER.span("button",button.btype,button.action or button.link,self.win):
+                BUTTON_TYPE_ACTIONS[button.btype](self,button)
+
 
     def back_button(self,button):
         """Button for going back one window in the UI, closes the current window and puts focus on the previous one"""
-        self.master.grab_set()
-        self.master.focus_set()
+        """with a Navigator the window is only hidden, so it can be shown again"""
+        navigator = Window.navigator
+        if navigator is not None and navigator.current.window is self and navigator.back():
+            return
+        if self.master is not None:
+            self.master.grab_set()
+            self.master.focus_set()
+        self.destroy()
+
+    def destroy(self):
+        """destroys the window and releases everything it holds, its widgets, Tcl variables and commands, images, Buttons and Form fields"""
+        if self.destroyed:
+            return
+        self.destroyed = True
+        if self._pump_id is not None:
+            self.win.after_cancel(self._pump_id)
+            self._pump_id = None
+        self._pending = None
+        self.layout.cancel()
+        if self.image_loader is not None:
+            self.image_loader.shutdown()
+            self.image_loader = None
+        if self.runner is not None:
+            self.runner.shutdown()
+            self.runner = None
+        interp = self.win.tk
+        variables = []
+        if self.form is not None:
+            for field in self.form.fields.values():
+                if isinstance(field.data,tk.Variable):
+                    variables.append(field.data._name)
+                elif field.ftype == "multiple_select":
+                    variables.extend(var._name for var,_ in field.data)
+            if self.form._trace_command is not None:
+                self.form._trace_command_owner.deletecommand(self.form._trace_command)
+                self.form._trace_command = self.form._trace_command_owner = None
+            self.form.fields.clear()
+            self.form._variable_fields.clear()
+            self.form._labels.clear()
+            self.form.dirty.clear()
+        for command in (self._click_command,self._submit_command):
+            if command is not None:
+                """registered on self.win, so it has to be deleted through it or win.destroy() would delete it again"""
+                self.win.deletecommand(command)
+        self._click_command = self._submit_command = None
+        """tkinter deletes the Tcl commands for the bindings as it destroys each widget"""
         self.win.destroy()
+        for name in variables:
+            if interp.getboolean(interp.call("info","exists",name)):
+                interp.unsetvar(name)
+        for key in self._image_keys:
+            IMAGE_CACHE.release(key)
+        self._leak_check = (interp,str(self.win),variables)
+        self._image_keys = []
+        self.images = []
+        self._placeholders = {}
+        self.buttons.clear()
+        self.frames.clear()
+        self.repeats.clear()
+        self.registry.clear()
+        self.root_node = None
+        self._on_built = []
+
+    def layout_snapshot(self):
+        """returns the built page as plain data, the widget tree with its options and placement, the Form fields and the button wiring"""
+        """only headless windows have a widget tree to snapshot"""
+        snapshot = {
+            "title":self.win.title(),
+            "fields":{name:field.ftype if isinstance(field.ftype,str) else field.ftype.__name__ for name,field in self.form.fields.items()} if self.form else {},
+            "buttons":{path:{"btype":b.btype,"link":b.link,"action":b.action} for path,b in self.buttons.items()},
+        }
+        if self.toolkit.headless:
+            snapshot["tree"] = self.main_frame.snapshot()
+        return snapshot
+
+    def resource_report(self):
+        """returns what the window still holds, after destroy() every count should be 0"""
+        report = {
+            "buttons":len(self.buttons),
+            "frames":len(self.frames),
+            "images":len(self.images),
+            "fields":len(self.form.fields) if self.form is not None else 0,
+            "nodes":self._count_nodes(self.root_node),
+        }
+        if self._leak_check is not None:
+            interp,path,variables = self._leak_check
+            try:
+                report["tk_widgets"] = int(interp.getboolean(interp.call("winfo","exists",path)))
+                report["tcl_variables"] = sum(1 for name in variables if interp.getboolean(interp.call("info","exists",name)))
+            except tk.TclError:
+                """the interpreter is gone, so nothing can be left in it"""
+                report["tk_widgets"] = report["tcl_variables"] = 0
+        return report
+
+    def _count_nodes(self,node):
+        return 0 if node is None else 1+sum(self._count_nodes(child) for child in node.children)
+
+    @staticmethod
+    def leak_report():
+        """returns the resource_report of every destroyed Window that something is still holding on to, and anything it left behind"""
+        import gc
+        gc.collect()
+        report = []
+        for window in list(Window._windows):
+            if window.destroyed:
+                entry = window.resource_report()
+                entry["window"] = f"{type(window).__name__} at {hex(id(window))}"
+                entry["referrers"] = len(gc.get_referrers(window))
+                report.append(entry)
+        return report
 
     def link_clicked(self,button):
         if button.args:
@@ -446,19 +3660,35 @@ class Window():
         """Sends the gui to the next window as denoted by the file in the path for the link"""
         path = os.path.join("gui_pages",f"{link}")
         print("link clicked:",link)
+        if Window.prefetcher is not None:
+            Window.prefetcher.cancel()
         if os.path.isfile(path):
-            try:
-                window = self.windows[link]
-            except Exception as e:
-                window = Window
-            w = window(TagUtility.get_html(path),master=self.win)
-            w.post(*args,**kwargs)
+            if Window.navigator is not None:
+                Window.navigator.goto(self,link,path,*args,**kwargs)
+            else:
+                self.open_page(link,path,self.win,*args,**kwargs)
 
         else :
             tkmb.showerror(title="Page not Found", message=f"Error: \"{path}\" does not exist!")
 
+    def open_page(self,link,path,master,*args,**kwargs):
+        """creates and posts the Window for a linked page, using the window type registered for the link"""
+        try:
+            window = self.windows[link]
+        except Exception as e:
+            window = Window
+        """the new window is built with the opener's toolkit, so a link from a headless window stays headless"""
+        w = window(TagUtility.get_cached_html(path),master=master,toolkit=self.toolkit)
+        w.post(*args,**kwargs)
+        return w
+
     def button_action(self,button):
         """if the button is an action type try to execute the function in the Button class"""
+        import inspect
+        method = getattr(button,button.action,None)
+        if button.run == "background" or inspect.iscoroutinefunction(method) or getattr(method,"run_in_background",False):
+            self.run_action(button,method)
+            return
 
         try:
             if button.args:
@@ -468,18 +3698,58 @@ class Window():
         except Exception as e:
             print(e)
 
+    def run_action(self,button,method):
+        """runs a button's action in the ActionRunner, the button is disabled and the cursor is busy until it finishes"""
+        """when it finishes the Button's <action>_done(result) or <action>_failed(error) method is called, if it has one"""
+        if self.runner is None:
+            self.runner = ActionRunner(self.win)
+        args = (button.args,) if button.args else ()
+        button.future = self.runner.submit(method,*args,\
+            on_done=lambda result: self._action_finished(button,"_done",result),\
+            on_error=lambda error: self._action_finished(button,"_failed",error))
+        if button.widget is not None:
+            button.widget.config(state=tk.DISABLED)
+        self.win.config(cursor="watch")
+
+    def _action_finished(self,button,suffix,value):
+        self._set_idle(button)
+        callback = getattr(button,button.action+suffix,None)
+        if callback:
+            callback(value)
+        elif suffix == "_failed":
+            print(value)
+
+    def _set_idle(self,button):
+        button.future = None
+        if button.widget is not None and button.widget.winfo_exists():
+            button.widget.config(state=tk.NORMAL)
+        if not self.runner.running:
+            self.win.config(cursor="")
+
+    def cancel_action(self,button):
+        """cancels a button's background action and puts the button back to normal"""
+        if button.future is not None:
+            self.runner.cancel(button.future)
+            self._set_idle(button)
+
+    def cancel_clicked(self,button):
+        """Button for cancelling background actions, cancels the buttons whose action is named in args, or every running action"""
+        for other in list(self.buttons.values()):
+            if other.future is not None and (not button.args or other.action == button.args):
+                self.cancel_action(other)
+
     def create_input(self,input_tag,parent):
         """Creates an input for a form"""
         return INPUT_TYPE_ACTIONS[TagUtility.get_attribute(input_tag,"type")](self,input_tag,parent)
 
     def create_text_input(self,input_tag,parent):
         """creates a text input with the necessary tkinter widgets and back end in the Form class"""
-        var = tk.StringVar()
+        var = self.toolkit.StringVar()
         default = TagUtility.get_attribute(input_tag,"default")
         hidden = TagUtility.get_attribute(input_tag,"hidden")
         if default:
             var.set(default)
-        entry = tk.Entry(parent,textvariable=var)
+        entry = self.toolkit.Entry(parent,textvariable=var)
         if hidden:
             entry.config(show="\u2022")
 
@@ -490,7 +3760,7 @@ class Window():
     def create_submit_input(self,input_tag,parent):
         """creates the submit button for Forms"""
         text = TagUtility.get_attribute(input_tag,"text",str)
-        button = tk.Button(parent, command=lambda : self.form.submit(), text=text)
+        button = self.toolkit.Button(parent, command=lambda : self.form.submit(), text=text)
         button.grid(TagUtility.get_grid_args(input_tag))
         return button
 
@@ -500,12 +3770,43 @@ class Window():
         name = TagUtility.get_attribute(select,"name")
         if multiple:
             self.form.add_field(Field("multiple_select",name,[]))
-            self.create_frame(select,parent,multiple=True,name=name)
+            return self.create_frame(select,parent,multiple=True,name=name)
         else:
-            tksv = tk.StringVar()
+            tksv = self.toolkit.StringVar()
             tksv.set(select.find_all("option")[0]['value'])
             self.form.add_field(Field("select",name,tksv))
-            self.create_frame(select,parent,variable=tksv,multiple=False)
+            return self.create_frame(select,parent,variable=tksv,multiple=False)
+
+    def create_logview(self,logview,parent):
+        """Creates a LogView from the html soup, other threads write to it with append(), extend() or write()"""
+        """autoscroll="false" stops it following new lines, filter is a regular expression lines have to match to be shown"""
+        autoscroll = TagUtility.get_attribute(logview,"autoscroll",TagUtility.bool_from_str)
+        view = self.toolkit.LogView(parent,autoscroll=autoscroll is not False,filter=TagUtility.get_attribute(logview,"filter"),\
+            **TagUtility.get_logview_args(logview))
+        initial = logview.text.strip()
+        if initial:
+            view.extend(initial.splitlines())
+        view.grid(TagUtility.get_grid_args(logview))
+
+        view_id = TagUtility.get_attribute(logview,"id")
+        if not view_id:
+            view_id = str(view)
+        self._add_frame(view_id,view)
+        return view
+
+    def create_textarea(self,textarea,parent):
+        """Creates a tk.Text from the html soup, or a LogView for <textarea stream>"""
+        if textarea.has_attr("stream") and TagUtility.get_attribute(textarea,"stream") != "false":
+            return self.create_logview(textarea,parent)
+        args = TagUtility.get_logview_args(textarea)
+        args.pop("maxlines",None)
+        text = self.toolkit.Text(parent,**args)
+        text.insert(tk.END,textarea.text.strip())
+        text.grid(TagUtility.get_grid_args(textarea))
+        text_id = TagUtility.get_attribute(textarea,"id")
+        if text_id:
+            self._add_frame(text_id,text)
+        return text
 
     def create_option(self,option,parent,variable=None,multiple=False,name=None):
         """Creates an option for the radio or check buttons"""
@@ -514,12 +3815,12 @@ class Window():
         if not value:
             value = text
         if multiple:
-            tkiv = tk.IntVar()
+            tkiv = self.toolkit.IntVar()
             self.form.add_to_multiple_select(name,(tkiv,value))
-            b = tk.Checkbutton(parent,text=text,variable=tkiv)
+            b = self.toolkit.Checkbutton(parent,text=text,variable=tkiv)
 
         else:
-            b = tk.Radiobutton(parent,text=text,variable=variable,value=value)
+            b = self.toolkit.Radiobutton(parent,text=text,variable=variable,value=value)
 
         b.grid(TagUtility.get_grid_args(option))
 
@@ -528,10 +3829,201 @@ class Window():
         else :
             return (b,self.buildBody(option,parent))
 
+    def update_from(self,soup=None,path=None):
+        """patches the window to show a new version of the page, given as a soup or a path"""
+        """the new page is diffed against the node tree, matching tags by id or name, and only the widgets that differ get created, destroyed or reconfigured"""
+        if soup is None:
+            soup = TagUtility.get_cached_html(path)
+        self.finish_build()
+        old_soup = self.soup
+        self.soup = soup
+        if [(t.name,t.text) for t in old_soup.head if t.name] != [(t.name,t.text) for t in soup.head if t.name]:
+            self.buildHead(soup.head)
+        self.layout.pause()
+        try:
+            self._patch_children(self.root_node,soup.body)
+        finally:
+            self.layout.resume()
+
+    def _patch_children(self,node,new_parent):
+        """matches the children of node against the child tags of new_parent and patches, builds or destroys them"""
+        """new children are built like the existing ones, in the same container and with the same extra arguments"""
+        if node.children:
+            template = node.children[0]
+            container,args,kwargs = template.container,template.args,template.kwargs
+        else:
+            container,args,kwargs = node.widget() if node.tag is not None else self.main_frame,(),{}
+        by_key = {}
+        by_position = {}
+        for child in node.children:
+            key = child.key()
+            if key:
+                by_key.setdefault(key,child)
+            else:
+                by_position.setdefault(child.tag.name,[]).append(child)
+        for children in by_position.values():
+            children.reverse()
+        children = []
+        for tag in new_parent:
+            if tag.name is None:
+                continue
+            key = (tag.name,TagUtility.get_attribute(tag,"id") or TagUtility.get_attribute(tag,"name"))
+            if key[1]:
+                old = by_key.pop(key,None)
+            else:
+                old = by_position.get(tag.name,[None]).pop() if by_position.get(tag.name) else None
+            if old is None:
+                children.append(self._build_node(tag,node,container,args,kwargs))
+            else:
+                children.append(self._patch_node(old,tag))
+        for old in list(by_key.values())+[old for olds in by_position.values() for old in olds]:
+            self._destroy_node(old)
+        node.children = children
+        self.registry.stale = True
+
+    def _patch_node(self,old,tag):
+        """brings one built node up to date with its new tag, returns the node that now represents the tag"""
+        if TagUtility.same_tag(old.tag,tag):
+            self._retag(old,tag)
+            return old
+        widget = old.widget()
+        if tag.name in ("div","form","select") and self._same_attributes(old.tag,tag,TagUtility.GRID_ARGS):
+            if isinstance(widget,VirtualScrollFrame):
+                widget.set_rows([child for child in tag if child.name is not None])
+            else:
+                self._patch_children(old,tag)
+            self._patch_grid(widget,old.tag,tag)
+            self._retag(old,tag)
+            return old
+        elif tag.name in ("label","button") and self.PATCH_ACTIONS[tag.name](old.tag,old.element,tag):
+            self._retag(old,tag)
+            return old
+        """it can't be patched, so rebuild it in the same grid cell"""
+        grid = widget.grid_info() if widget is not None else {}
+        self._destroy_node(old)
+        node = self._build_node(tag,old.parent,old.container,old.args,old.kwargs)
+        new_widget = node.widget()
+        if grid and new_widget is not None and "row" not in tag.attrs and "column" not in tag.attrs:
+            new_widget.grid_configure(row=grid["row"],column=grid["column"])
+        return node
+
+    def _retag(self,node,tag):
+        """points a node at the new version of its tag, re-indexing it if its id, name or class changed"""
+        old,node.tag = node.tag,tag
+        if old.get("id") != tag.get("id") or old.get("name") != tag.get("name") or old.get("class") != tag.get("class"):
+            self.registry.update(node)
+
+    def _build_node(self,tag,parent,container,args,kwargs):
+        node = self._node
+        self._node = parent
+        try:
+            return self._build_tag(tag,container,args,kwargs)
+        finally:
+            self._node = node
+
+    def _destroy_node(self,node):
+        """destroys the widgets built for a node and removes its buttons, frames and Form fields"""
+        for child in node.children:
+            self._destroy_node(child)
+        self.registry.remove(node)
+        for field in node.fields:
+            self.form.remove_field(field)
+        for field,data in node.options:
+            self.form.remove_from_multiple_select(field,data)
+        node.fields,node.options = [],[]
+        for key in node.buttons:
+            self.buttons.pop(key,None)
+        for key,frame in node.frames:
+            if self.frames.get(key) is frame:
+                del self.frames[key]
+        for key,rep in node.repeats:
+            if self.repeats.get(key) is rep:
+                del self.repeats[key]
+        node.buttons,node.frames,node.repeats = [],[],[]
+        widget = node.widget()
+        if isinstance(widget,VirtualScrollFrame):
+            for slot in list(widget.visible.values())+widget.pool:
+                self._destroy_node(slot.node)
+        if widget is not None:
+            widget.destroy()
+        node.children = []
+
+    def patch_elements(self,old_tags,elements,new_tags):
+        """reconfigures the widgets built from old_tags so they show new_tags instead"""
+        """returns False if the tags don't have the same structure, in which case the widgets need to be rebuilt"""
+        old_tags = [tag for tag in old_tags if tag.name is not None]
+        new_tags = [tag for tag in new_tags if tag.name is not None]
+        if len(old_tags) != len(new_tags) or len(old_tags) != len(elements):
+            return False
+        for old,element,new in zip(old_tags,elements,new_tags):
+            if old.name != new.name or old.name not in self.PATCH_ACTIONS:
+                return False
+            if not self.PATCH_ACTIONS[old.name](old,element,new):
+                return False
+        return True
+
+    @staticmethod
+    def _same_attributes(old,new,ignore=()):
+        """checks if two tags have the same attributes, apart from the ones in ignore"""
+        return {k:v for k,v in old.attrs.items() if k not in ignore} == {k:v for k,v in new.attrs.items() if k not in ignore}
+
+    @staticmethod
+    def _patch_grid(widget,old,new):
+        grid = TagUtility.get_grid_args(new)
+        if TagUtility.get_grid_args(old) != grid:
+            widget.grid_forget()
+            widget.grid(grid)
+
+    def patch_label(self,old,label,new):
+        """reconfigures a tk.Label for a new version of its tag"""
+        if not self._same_attributes(old,new,TagUtility.GRID_ARGS):
+            return False
+        text = new.text.strip()
+        if TagUtility.get_attribute(new,"type") != "display" and label["text"] != text:
+            label["text"] = text
+        self._patch_grid(label,old,new)
+        return True
+
+    def patch_button(self,old,button,new):
+        """reconfigures a tk.Button for a new version of its tag, and swaps in a Button object for the new link or action"""
+        if not self._same_attributes(old,new,set(TagUtility.GRID_ARGS)|set(TagUtility.BUTTON_ARGS)):
+            return False
+        if [img.get("src") for img in old.find_all("img")] != [img.get("src") for img in new.find_all("img")]:
+            return False
+        text = new.text.strip()
+        if button["text"] != text:
+            button["text"] = text
+        self._patch_grid(button,old,new)
+        self._register_button(button,new)
+        return True
+
+    def patch_frame(self,old,element,new):
+        """reconfigures a tk.Frame and its children for a new version of its tag"""
+        if TagUtility.get_attribute(new,"scrolling",TagUtility.bool_from_str) or not self._same_attributes(old,new,TagUtility.GRID_ARGS):
+            return False
+        tk_frame,elements = element
+        if not self.patch_elements(old,elements,new):
+            return False
+        self._patch_grid(tk_frame,old,new)
+        return True
+
     def get_frame_by_id(self,_id):
         """returns a reference to a frame based on the string ID"""
         return self.frames[_id]
 
+    def query(self,selector):
+        """returns the widgets for every tag that matches a CSS style selector, like "form#login input[type=text]", in the order they were built"""
+        return [node.widget() for node in self.registry.query(selector)]
+
+    def query_one(self,selector):
+        """returns the widget for the first tag that matches the selector, or None"""
+        nodes = self.registry.query(selector)
+        return nodes[0].widget() if nodes else None
+
+    def query_nodes(self,selector):
+        """returns the Nodes that match the selector, with their tags, widgets and Form fields"""
+        return self.registry.query(selector)
+
     def post(self):
         """The initialize function, to be overwritten in Base classes, but provides a default behavior of initializing the window"""
         self._initialize()
@@ -540,14 +4032,44 @@ class Window():
     def set_client(_client):
         """Sets a static reference to the Client obejct so all Windows can interact with the client"""
         Window.client = _client
+
+    @staticmethod
+    def set_navigator(_navigator):
+        """Sets the Navigator links and back buttons go through, or None to open a new window for every link again"""
+        if Window.navigator is not None:
+            Window.navigator.clear()
+        Window.navigator = _navigator
+
+    @staticmethod
+    def set_prefetcher(_prefetcher):
+        """Sets the Prefetcher all Windows use to prefetch the pages they link to, or None to turn prefetching off"""
+        if Window.prefetcher is not None:
+            Window.prefetcher.shutdown()
+        Window.prefetcher = _prefetcher
        
 BUTTON_TYPE_ACTIONS = {
     "back":Window.back_button,
     "link":Window.link_clicked,
     "action":Window.button_action,
+    "cancel":Window.cancel_clicked,
 }
 
 INPUT_TYPE_ACTIONS = {
     "text":Window.create_text_input,
     "submit":Window.create_submit_input,
-}
\ No newline at end of file
+}
+
+
+if __name__ == "__main__":
+    """python gui_engine.py compile [pages_dir ...] compiles the pages ahead of time"""
+    import argparse
+    argparser = argparse.ArgumentParser(prog="gui_engine.py",description="gui_engine tools")
+    commands = argparser.add_subparsers(dest="command",required=True)
+    compile_command = commands.add_parser("compile",help="compile HTML pages to Python modules")
+    compile_command.add_argument("pages",nargs="*",default=["gui_pages"],help="page directories or files (default: gui_pages)")
+    compile_command.add_argument("--parser",default=None,help="TagUtility parser backend to parse the pages with")
+    options = argparser.parse_args()
+    for target in options.pages:
+        paths = PageCompiler.compile_dir(target,options.parser) if os.path.isdir(target) else [PageCompiler.compile_file(target,options.parser)]
+        for path in paths:
+            print(path)
@@ -0,0 +1,691 @@
+"""
+test_gui_engine.py
+Tests for gui_engine.py, every window is built with the HeadlessToolkit so no display is needed
+
+Usage:
+    python -m pytest -q tests
+"""
+
+import os
+import sys
+import threading
+import time
+import tkinter as tk
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0,ROOT)
+
+import gui_engine
+from gui_engine import HeadlessToolkit, PageCache, TagUtility, Window
+
+PAGE = """<html><head><title>test</title></head><body>
+<label id="title" class="big bold">Hello &amp; welcome</label>
+<form id="login">
+<input type="text" name="user" id="user"/>
+<input type="text" name="password"/>
+<select name="color"><option value="red">red</option><option value="green">green</option></select>
+<button btype="submit">go</button>
+</form>
+<div id="outer" class="box"><div id="inner" class="box"><button link="other.html">other</button></div></div>
+</body></html>"""
+
+REPEAT_PAGE = """<html><head></head><body>
+<repeat id="people" source="people" key="id"><div id="cell"><label>{name}</label><button link="a.html">{id}</button></div></repeat>
+</body></html>"""
+
+def has_display():
+    try:
+        tk.Tk().destroy()
+        return True
+    except tk.TclError:
+        return False
+
+"""tests that build real Tk widgets, run them under xvfb-run where there is no display"""
+needs_display = pytest.mark.skipif(not has_display(),reason="Tk needs a display")
+
+def write_page(tmp_path,name,html):
+    path = tmp_path/name
+    path.write_text(html)
+    return str(path)
+
+def build(tmp_path,html,window=Window,parser="lite"):
+    return window(TagUtility.get_html(write_page(tmp_path,"page.html",html),parser),main=True,toolkit=HeadlessToolkit)
+
+def outline(tag):
+    """the names, attributes and text of a tree, as plain data that doesn't depend on the parser"""
+    if tag.name is None:
+        text = " ".join(str(tag).split())
+        return [text] if text else []
+    attrs = {k:" ".join(v) if isinstance(v,list) else v for k,v in tag.attrs.items()}
+    return [(tag.name,attrs,[part for child in tag for part in outline(child)])]
+
+@pytest.mark.parametrize("html",[
+    PAGE,
+    "<label>no html or body</label><input type='text' name='a'>",
+    "<html><head></head><body><div><span>a</span> b <img src='x.png'/></div></body></html>",
+])
+def test_lite_parser_matches_bs4(tmp_path,html):
+    path = write_page(tmp_path,"page.html",html)
+    lite = TagUtility.get_html(path,"lite")
+    soup = TagUtility.get_html(path,"lxml")
+    assert outline(lite.body) == outline(soup.body)
+    assert lite.body.text.split() == soup.body.text.split()
+
+def test_page_cache_invalidation(tmp_path):
+    path = write_page(tmp_path,"page.html","<html><body><label>one</label></body></html>")
+    cache = PageCache()
+    soup = cache.get(path)
+    assert cache.get(path) is soup
+    assert cache.stats()["hits"] == 1
+    write_page(tmp_path,"page.html","<html><body><label>one, edited</label></body></html>")
+    edited = cache.get(path)
+    assert edited is not soup
+    assert edited.body.find("label").text == "one, edited"
+    cache.invalidate(path)
+    assert cache.get(path) is not edited
+    assert cache.stats()["misses"] == 3
+
+def test_page_cache_hashes_contents(tmp_path):
+    path = write_page(tmp_path,"page.html","<html><body><label>aaa</label></body></html>")
+    cache = PageCache(hash_contents=True)
+    soup = cache.get(path)
+    stat = os.stat(path)
+    write_page(tmp_path,"page.html","<html><body><label>bbb</label></body></html>")
+    os.utime(path,ns=(stat.st_atime_ns,stat.st_mtime_ns))
+    assert cache.get(path) is not soup
+
+def test_form_snapshot_and_dirty_fields(tmp_path):
+    w = build(tmp_path,PAGE)
+    form = w.form
+    assert form.dirty == set()
+    assert form.snapshot(["user","password"]) == {"user":"","password":""}
+    form.get_field("user").data.set("alice")
+    assert form.dirty == {"user"}
+    assert form.changed_fields() == {"user":"alice"}
+    form.get_field("color").data.set("green")
+    assert form.snapshot()["color"] == "green"
+    assert form.dirty == {"user","color"}
+    form.mark_clean()
+    assert form.changed_fields() == {}
+    w.destroy()
+
+def test_repeat_update_reuses_rows(tmp_path):
+    class People(Window):
+        people = [{"id":1,"name":"ann"},{"id":2,"name":"bob"},{"id":3,"name":"cy"}]
+    w = build(tmp_path,REPEAT_PAGE,People)
+    rep = w.repeats["people"]
+    rows = dict(rep.rows)
+    assert list(rows) == ["1","2","3"]
+    w.update_repeat("people",[{"id":3,"name":"cy"},{"id":1,"name":"ann"},{"id":4,"name":"di"}])
+    assert list(rep.rows) == ["3","1","4"]
+    assert rep.rows["3"] is rows["3"] and rep.rows["1"] is rows["1"]
+    assert [w.buttons[key].link for key in w.buttons].count("a.html") == 3
+    """rows whose items share a key are all kept"""
+    w.update_repeat("people",[{"id":1,"name":"ann"},{"id":1,"name":"ann again"}])
+    assert len(rep.rows) == 2
+    assert len(rep.node.children) == 2
+    w.update_repeat("people",[])
+    assert len(rep.rows) == 0
+    assert "cell" not in w.frames
+    assert [b for b in w.buttons.values() if b.link == "a.html"] == []
+    w.destroy()
+
+def test_registry_query(tmp_path):
+    w = build(tmp_path,PAGE)
+    tags = lambda selector: [node.tag.get("id") or node.tag.get("name") or node.tag.name for node in w.registry.query(selector)]
+    assert tags("#user") == ["user"]
+    assert tags("form#login input[type=text]") == ["user","password"]
+    assert tags("form > select") == ["color"]
+    assert tags(".box") == ["outer","inner"]
+    assert tags(".box > .box button") == ["button"]
+    assert tags("select, #title, label.big") == ["title","color"]
+    assert tags("div label") == []
+    assert w.query("#user") == [w.registry.query("#user")[0].widget()]
+    w.destroy()
+
+def test_destroy_releases_everything(tmp_path):
+    w = build(tmp_path,PAGE)
+    report = w.resource_report()
+    assert report["buttons"] > 0 and report["fields"] > 0 and report["nodes"] > 0
+    interp = HeadlessToolkit.interp()
+    commands = set(interp.splitlist(interp.call("info","commands")))
+    w.destroy()
+    report = w.resource_report()
+    assert {key:value for key,value in report.items() if value} == {}
+    """the Form's trace command, and the click and submit commands, are deleted from the shared interpreter"""
+    assert set(interp.splitlist(interp.call("info","commands"))) < commands
+
+def test_headless_builds_are_repeatable(tmp_path):
+    first = build(tmp_path,PAGE)
+    snapshot = first.layout_snapshot()
+    first.destroy()
+    second = build(tmp_path,PAGE)
+    assert HeadlessToolkit.diff(snapshot,second.layout_snapshot()) == []
+    second.destroy()
+
+def test_compiled_page_matches_parsed_page(tmp_path):
+    path = write_page(tmp_path,"page.html",PAGE)
+    gui_engine.PageCompiler.compile_file(path)
+    compiled = gui_engine.PageCompiler.load(path)
+    assert outline(compiled.body) == outline(TagUtility.get_html(path,"lite").body)
+
+@pytest.mark.parametrize("parser",["lxml","html.parser","lite"])
+def test_compiled_page_skips_comments_and_doctype(tmp_path,parser):
+    path = write_page(tmp_path,"page.html","<!DOCTYPE html><html><body><label>Hi<!-- secret note --></label><?pi x?></body></html>")
+    gui_engine.PageCompiler.compile_file(path,parser)
+    compiled = gui_engine.PageCompiler.load(path)
+    assert [child for child in compiled if child.name is None] == []
+    assert outline(compiled.body) == [("body",{},[("label",{},["Hi"])])]
+    assert outline(compiled.body) == outline(TagUtility.get_html(path,"lite").body)
+
+def test_compiled_tags_have_their_own_attrs(tmp_path):
+    path = write_page(tmp_path,"page.html","<html><body><br/><hr/></body></html>")
+    gui_engine.PageCompiler.compile_file(path)
+    first,second = gui_engine.PageCompiler.load(path).body.find_all()
+    first.attrs["id"] = "changed"
+    assert second.attrs == {}
+
+LISTBOX_PAGE = """<html><head></head><body><form>
+<label>name</label><input type="text" name="user"/>
+<listbox name="fruit"><li>apple</li><li>pear</li></listbox>
+<listbox name="veg" scrolling="true"><li>leek</li></listbox>
+</form></body></html>"""
+
+@needs_display
+def test_batched_listbox_tracks_selection(tmp_path):
+    class Batched(Window):
+        batched = True
+    w = Batched(TagUtility.get_html(write_page(tmp_path,"page.html",LISTBOX_PAGE),"lite"),main=True)
+    listbox = w.form.get_field("fruit").data[0]
+    assert listbox.winfo_exists()
+    assert listbox.get(0,"end") == ("apple","pear")
+    listbox.selection_set(1)
+    listbox.event_generate("<<ListboxSelect>>")
+    w.win.update()
+    assert w.form.changed_fields() == {"fruit":["pear"]}
+    w.destroy()
+
+SELECT_PAGE = """<html><head></head><body><form>
+<label for="user">{label}</label><input type="text" name="user" {attrs}/>
+<select name="s" multiple="true"><option value="a">a</option>{option}</select>
+</form></body></html>"""
+
+def test_update_from_removes_destroyed_options(tmp_path):
+    w = build(tmp_path,SELECT_PAGE.format(label="user",attrs="",option='<option value="b">b</option>'))
+    w.form.get_field("s").data[1][0].set(1)
+    assert w.form.snapshot(["s"]) == {"s":["b"]}
+    w.update_from(TagUtility.get_html(write_page(tmp_path,"new.html",SELECT_PAGE.format(label="user",attrs="",option="")),"lite"))
+    assert w.form.snapshot(["s"]) == {"s":[]}
+    assert [value for _,value in w.form.get_field("s").data] == ["a"]
+    w.destroy()
+
+def test_update_from_repoints_labels_at_rebuilt_fields(tmp_path):
+    w = build(tmp_path,SELECT_PAGE.format(label="user",attrs="",option=""))
+    w.update_from(TagUtility.get_html(write_page(tmp_path,"new.html",SELECT_PAGE.format(label="user",attrs='width="30"',option="")),"lite"))
+    user = w.form.get_field("user").data
+    label = w.query("label")[0]
+    assert str(label["textvariable"]) == user._name
+    user.set("alice")
+    assert w.form.changed_fields() == {"user":"alice"}
+    w.destroy()
+
+def test_detached_rows_are_not_queryable(tmp_path):
+    w = build(tmp_path,PAGE)
+    row = gui_engine.Node(None,w.main_frame,detached=True)
+    soup = TagUtility.get_html(write_page(tmp_path,"row.html",'<html><body><div id="row7"><button link="a.html">x</button></div></body></html>'),"lite")
+    w.build_under(row,soup.body,w.main_frame)
+    assert w.query("#row7") == []
+    assert len(w.buttons) == 3
+    w._destroy_node(row)
+    assert len(w.buttons) == 2
+    w.destroy()
+
+def test_query_keeps_build_order_after_update_from(tmp_path):
+    html = '<html><body><label id="a" {attrs}>a</label><label id="b" class="x">b</label></body></html>'
+    w = build(tmp_path,html.format(attrs=""))
+    w.update_from(TagUtility.get_html(write_page(tmp_path,"new.html",html.format(attrs='class="x"')),"lite"))
+    ids = lambda selector: [node.tag.get("id") for node in w.registry.query(selector)]
+    assert ids(".x") == ["a","b"]
+    assert ids(".x, label") == ["a","b"]
+    w.destroy()
+
+def test_query_keeps_page_order_after_patching(tmp_path):
+    html = '<html><body><div id="box">{inner}</div><label id="z" class="x">z</label></body></html>'
+    w = build(tmp_path,html.format(inner='<label id="a" class="x">a</label>'))
+    w.update_from(TagUtility.get_html(write_page(tmp_path,"new.html",html.format(inner='<label id="a" class="x">a</label><label id="b" class="x">b</label>')),"lite"))
+    assert [node.tag.get("id") for node in w.registry.query(".x")] == ["a","b","z"]
+    w.destroy()
+
+def test_links_from_headless_windows_stay_headless(tmp_path,monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    os.mkdir("gui_pages")
+    write_page(tmp_path,"gui_pages/next.html","<html><head></head><body><label>next</label></body></html>")
+    w = build(tmp_path,PAGE)
+    opened = w.open_page("next.html",os.path.join("gui_pages","next.html"),w.win)
+    assert opened.toolkit is HeadlessToolkit
+    assert opened.layout_snapshot()["tree"]
+    opened.destroy()
+    w.destroy()
+
+BATCH_PAGE = """<html><head></head><body>
+<label>title</label>
+<div id="top"><label row="0" column="0">left</label><label row="0" column="1">right</label><button link="a.html">go</button></div>
+<form>
+<label>name</label><input type="text" name="user"/>
+<label>password</label><input type="text" name="password"/>
+<listbox name="fruit"><li>apple</li><li>pear</li></listbox>
+<scrollbox name="veg"><li>leek</li><li>kale</li></scrollbox>
+<select name="color"><option value="red">red</option><option value="blue">blue</option></select>
+</form>
+</body></html>"""
+
+def describe(widget):
+    """the class, text, grid placement and children of a Tk widget tree, without the widget names batched builds choose"""
+    options = {}
+    for option in ("text","show","selectmode","height","width"):
+        try:
+            options[option] = str(widget.cget(option))
+        except tk.TclError:
+            pass
+    grid = {k:str(v) for k,v in widget.grid_info().items() if k != "in"}
+    return (widget.winfo_class(),options,grid,[describe(child) for child in widget.winfo_children()])
+
+@needs_display
+def test_batched_build_matches_normal_build(tmp_path):
+    class Batched(Window):
+        batched = True
+    windows = [window(TagUtility.get_html(write_page(tmp_path,"page.html",BATCH_PAGE),"lite"),main=True) for window in (Window,Batched)]
+    normal,batched = windows
+    assert describe(batched.main_frame) == describe(normal.main_frame)
+    assert batched.form.snapshot() == normal.form.snapshot()
+    assert batched.form.dirty == set()
+    for w in windows:
+        w.form.get_field("user").data.set("alice")
+        w.form.get_field("veg").data[0].selection_set(1)
+    assert batched.form.snapshot() == normal.form.snapshot()
+    assert batched.form.changed_fields() == normal.form.changed_fields() == {"user":"alice"}
+    assert sorted(b.link for b in batched.buttons.values()) == sorted(b.link for b in normal.buttons.values())
+    for w in windows:
+        w.destroy()
+
+def test_headless_builds_are_never_progressive(tmp_path):
+    built = []
+    w = Window(TagUtility.get_html(write_page(tmp_path,"page.html",BATCH_PAGE),"lite"),main=True,progressive=True,toolkit=HeadlessToolkit)
+    w.when_built(lambda: built.append(True))
+    assert not w.progressive
+    assert built == [True]
+    assert w.form.get_field("veg") is not None
+
+@needs_display
+def test_progressive_build_matches_normal_build(tmp_path):
+    class Progressive(Window):
+        progressive = True
+        first_screen = 1
+    normal = Window(TagUtility.get_html(write_page(tmp_path,"page.html",BATCH_PAGE),"lite"),main=True)
+    progressive = Progressive(TagUtility.get_html(write_page(tmp_path,"page.html",BATCH_PAGE),"lite"),main=True)
+    built = []
+    progressive.when_built(lambda: built.append(True))
+    assert built == []
+    assert describe(progressive.main_frame) != describe(normal.main_frame)
+    progressive.finish_build()
+    assert built == [True]
+    assert describe(progressive.main_frame) == describe(normal.main_frame)
+    assert progressive.form.snapshot() == normal.form.snapshot()
+    assert [describe(widget) for widget in progressive.query("label")] == [describe(widget) for widget in normal.query("label")]
+    for w in (normal,progressive):
+        w.destroy()
+
+def test_headless_logview_splits_lines(tmp_path):
+    w = build(tmp_path,'<html><head></head><body><logview id="log" maxlines="3"></logview></body></html>')
+    log = w.get_frame_by_id("log")
+    log.append("one\ntwo")
+    log.extend(["three","four\nfive"])
+    log.write("six\nsev")
+    assert list(log.buffer) == ["four","five","six"]
+    w.destroy()
+
+@needs_display
+def test_logview_trims_whole_lines():
+    root = tk.Tk()
+    log = gui_engine.LogView(root,maxlines=3)
+    log.append("one\ntwo")
+    log.extend(["three","four\nfive"])
+    assert len(log.pending) == 3 and log.dropped == 2
+    log._poll()
+    assert log.text.get("1.0","end-1c") == "three\nfour\nfive\n"
+    log.append("six\nseven")
+    log._poll()
+    assert log.text.get("1.0","end-1c") == "five\nsix\nseven\n"
+    root.destroy()
+
+@needs_display
+def test_image_loader_caches_visibility_until_the_view_changes(tmp_path):
+    w = Window(TagUtility.get_html(write_page(tmp_path,"page.html",PAGE),"lite"),main=True)
+    loader = gui_engine.ImageLoader(w)
+    label = w.query("#title")[0]
+    w.win.update()
+    visible = loader._visible(label)
+    assert loader._visibility == {label:visible}
+    w.win.event_generate("<Configure>")
+    assert loader._visibility == {}
+    loader.shutdown()
+    w.destroy()
+
+def test_loaded_images_reuse_the_one_already_held(tmp_path):
+    """two widgets waiting on the same image both get the PhotoImage the first one made, without needing Tk here"""
+    path, = make_images(tmp_path,1)
+    cache = gui_engine.ImageCache(cache_dir=False)
+    key,photo = cache.acquire_cached(path,100)
+    assert photo is None
+    img_pil = cache.load(path,100)
+    assert max(img_pil.size) == 100
+    held = object()
+    cache._in_use[key] = [held,1]
+    assert cache.acquire_loaded(key,img_pil) is held
+    assert cache.acquire_cached(path,100) == (key,held)
+    assert cache._in_use[key] == [held,3]
+    for _ in range(3):
+        cache.release(key)
+    assert key not in cache._in_use and cache._photos[key] is held
+
+def test_prefetcher_keeps_its_own_warm_cap(tmp_path,monkeypatch):
+    Image = pytest.importorskip("PIL.Image")
+    os.mkdir(tmp_path/"gui_pages")
+    for name in ("a","b"):
+        Image.new("RGB",(100,100)).save(tmp_path/f"{name}.png")
+    write_page(tmp_path,"gui_pages/next.html",f'<html><head></head><body><img src="{tmp_path/"a.png"}"/><img src="{tmp_path/"b.png"}"/></body></html>')
+    cache = gui_engine.ImageCache(cache_dir=False)
+    monkeypatch.setattr(gui_engine,"IMAGE_CACHE",cache)
+    """each image warms to 250x250 RGB, 187500 bytes, so only one of them fits"""
+    prefetcher = gui_engine.Prefetcher(max_bytes=200000,pages_dir=str(tmp_path/"gui_pages"))
+    prefetcher.prefetch(["next.html"])
+    for future in list(prefetcher._futures):
+        future.result()
+    prefetcher.shutdown()
+    assert cache.max_warm_bytes == 32*1024*1024
+    assert cache.stats()["warm_bytes"] == 187500
+
+def make_images(tmp_path,count,size=(300,200)):
+    Image = pytest.importorskip("PIL.Image")
+    paths = []
+    for i in range(count):
+        path = tmp_path/f"image{i}.png"
+        Image.effect_noise(size,40+i).convert("RGB").save(path)
+        paths.append(str(path))
+    return paths
+
+def test_image_cache_disk_store(tmp_path):
+    src, = make_images(tmp_path,1)
+    cache_dir = str(tmp_path/"thumbnails")
+    first = gui_engine.ImageCache(cache_dir=cache_dir)
+    assert first.load(src,100).size == (100,66)
+    assert first.stats()["misses"] == 1
+    """a new cache, like after a restart, reads the thumbnail instead of resizing again"""
+    second = gui_engine.ImageCache(cache_dir=cache_dir)
+    assert second.load(src,100).size == (100,66)
+    assert (second.stats()["disk_hits"],second.stats()["misses"]) == (1,0)
+    assert second.load(src,50).size == (50,33)
+    assert second.stats()["misses"] == 1
+    """editing the file changes its key"""
+    os.utime(src,ns=(0,0))
+    second.load(src,100)
+    assert second.stats()["misses"] == 2
+    second.clear(disk=True)
+    assert os.listdir(cache_dir) == []
+
+def test_image_cache_prunes_least_recently_used_thumbnails(tmp_path):
+    sources = make_images(tmp_path,4)
+    cache = gui_engine.ImageCache(cache_dir=str(tmp_path/"thumbnails"),max_disk_bytes=None)
+    for i,src in enumerate(sources):
+        cache.load(src)
+        os.utime(cache._disk_path(cache._key(src,250,"path")),ns=(i*10**9,i*10**9))
+    sizes = sorted(entry[1] for entry in cache._disk_entries())
+    assert cache.prune_disk(sum(sizes)-1) == 1
+    assert not os.path.exists(cache._disk_path(cache._key(sources[0],250,"path")))
+    assert cache.prune_disk(0) == 3
+    assert cache._disk_entries() == []
+
+def test_image_cache_caps_the_disk_store(tmp_path):
+    sources = make_images(tmp_path,4)
+    cache = gui_engine.ImageCache(cache_dir=str(tmp_path/"thumbnails"),max_disk_bytes=None)
+    cache.load(sources[0])
+    size = cache._disk_entries()[0][1]
+    cache.clear(disk=True)
+    cache = gui_engine.ImageCache(cache_dir=str(tmp_path/"thumbnails"),max_disk_bytes=int(size*3.5))
+    for i,src in enumerate(sources[:3]):
+        cache.load(src)
+        os.utime(cache._disk_path(cache._key(src,250,"path")),ns=(i*10**9,i*10**9))
+    cache.load(sources[3])
+    """the fourth thumbnail goes over the cap, so the oldest are deleted until the store is under 3/4 of it"""
+    assert sorted(entry[2] for entry in cache._disk_entries()) == sorted(cache._disk_path(cache._key(src,250,"path")) for src in sources[2:])
+
+class Rows():
+    """a million row provider that records the ranges it was asked for"""
+    def __init__(self,count=1000000):
+        self.count = count
+        self.fetched = []
+    def provider(self):
+        return gui_engine.ListProvider(lambda: self.count,self.fetch)
+    def fetch(self,start,stop):
+        self.fetched.append((start,stop))
+        return [f"row {i}" for i in range(start,stop)]
+
+VIRTUAL_LIST_PAGE = '<html><head></head><body><form><listbox name="rows" provider="rows" height="5"></listbox></form></body></html>'
+
+def test_virtual_listbox_reads_only_selected_rows(tmp_path):
+    rows = Rows()
+    class Big(Window):
+        def __init__(self,*args,**kwargs):
+            self.rows = rows.provider()
+            super().__init__(*args,**kwargs)
+    w = build(tmp_path,VIRTUAL_LIST_PAGE,Big)
+    vlist = w.form.get_field("rows").data
+    assert vlist.options["rows"] == 1000000
+    vlist.selection_set(999998)
+    vlist.selection_set(3)
+    assert w.form.snapshot() == {"rows":["row 3","row 999998"]}
+    assert rows.fetched == [(3,4),(999998,999999)]
+    w.destroy()
+
+@needs_display
+def test_virtual_listbox_keeps_selection_while_scrolling():
+    root = tk.Tk()
+    rows = Rows()
+    vlist = gui_engine.VirtualListbox(root,rows.provider(),height=5,selectmode=tk.MULTIPLE)
+    assert vlist.listbox.get(0,"end") == tuple(f"row {i}" for i in range(5))
+    vlist.listbox.selection_set(1)
+    vlist._on_select(None)
+    vlist.yview("moveto","0.5")
+    assert vlist.listbox.get(0) == "row 500000"
+    assert vlist.listbox.size() == 5
+    vlist.listbox.selection_set(0)
+    vlist._on_select(None)
+    assert vlist.get_selected_items() == ["row 1","row 500000"]
+    root.destroy()
+
+VIRTUAL_ROWS_PAGE = """<html><head></head><body><div id="rows" scrolling="true" virtual="true" rowheight="24" height="120">{rows}</div></body></html>"""
+
+def test_headless_virtual_scroll_frame_builds_no_rows(tmp_path):
+    w = build(tmp_path,VIRTUAL_ROWS_PAGE.format(rows="".join(f'<div id="row{i}"><button link="a.html">{i}</button></div>' for i in range(1000))))
+    assert w.get_frame_by_id("rows").options["rowheight"] == 24
+    assert w.buttons == {}
+    assert w.query("#row7") == []
+    w.destroy()
+
+@needs_display
+def test_virtual_scroll_frame_recycles_rows(tmp_path):
+    html = VIRTUAL_ROWS_PAGE.format(rows="".join(f'<div id="row{i}"><button link="a.html">{i}</button></div>' for i in range(1000)))
+    w = Window(TagUtility.get_html(write_page(tmp_path,"page.html",html),"lite"),main=True)
+    w.win.update()
+    vframe = w.get_frame_by_id("rows")
+    realized = len(vframe.visible)
+    assert 0 < realized < 20
+    assert len(w.buttons) == realized
+    vframe.canvas.yview_moveto(0.5)
+    vframe.update_rows()
+    assert len(vframe.visible) == realized and min(vframe.visible) > 400
+    """the slots were rebound to other rows, their buttons too, and none of them can be queried"""
+    assert len(w.buttons) == realized
+    assert sorted(int(b.widget["text"]) for b in w.buttons.values()) == sorted(vframe.visible)
+    assert w.query("#row0") == [] and w.query("button") == []
+    w.destroy()
+    assert w.resource_report()["buttons"] == 0
+
+def run_until(widget,done,timeout=5):
+    """runs the widget's after callbacks until done() is true, the way the tkinter main loop would"""
+    end = time.monotonic()+timeout
+    while not done():
+        assert time.monotonic() < end, "timed out"
+        widget.update()
+        time.sleep(0.01)
+
+def test_action_runner_hands_results_back(tmp_path):
+    w = build(tmp_path,"<html><body><label>x</label></body></html>")
+    runner = gui_engine.ActionRunner(w.win)
+    async def double(x):
+        return x*2
+    def fail():
+        raise ValueError("nope")
+    results = []
+    runner.submit(sum,[1,2,3],on_done=results.append)
+    runner.submit(double,21,on_done=results.append)
+    runner.submit(fail,on_error=results.append)
+    run_until(w.win,lambda: len(results) == 3)
+    assert sorted(r for r in results if isinstance(r,int)) == [6,42]
+    assert [str(r) for r in results if isinstance(r,ValueError)] == ["nope"]
+    assert runner.running == {}
+
+class SlowButton(gui_engine.Button):
+    @gui_engine.run_in_background
+    def fetch(self):
+        return threading.current_thread().name
+
+    def fetch_done(self,result):
+        self.result = result
+
+def test_background_actions_run_off_the_tkinter_thread(tmp_path):
+    html = '<html><body><button action="fetch">fetch</button></body></html>'
+    w = Window(TagUtility.get_html(write_page(tmp_path,"page.html",html),"lite"),main=True,button=SlowButton,toolkit=HeadlessToolkit)
+    (path,button), = w.buttons.items()
+    w.button_action(button)
+    assert button.widget.options["state"] == tk.DISABLED
+    assert w.win.options["cursor"] == "watch"
+    run_until(w.win,lambda: button.future is None)
+    assert button.result.startswith("gui_engine")
+    assert button.widget.options["state"] == tk.NORMAL
+    assert w.win.options["cursor"] == ""
+
+def load_benchmark():
+    import importlib.util
+    spec = importlib.util.spec_from_file_location("benchmark",os.path.join(ROOT,"benchmarks","benchmark.py"))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+def test_benchmark_compare_flags_regressions(capsys):
+    benchmark = load_benchmark()
+    def navigation(cold,warm,cold_commands,warm_commands):
+        return {"cold_ms":benchmark.summarize(cold),"warm_ms":benchmark.summarize(warm),\
+            "cold_tcl_commands":cold_commands,"warm_tcl_commands":warm_commands,"widgets":10,"peak_rss_kb":1000}
+    old = {"results":{
+        "navigation":navigation([0.010,0.012],[0.002,0.003],5000,100),
+        "labels":{"build_ms":benchmark.summarize([0.1]),"tcl_commands":2000,"widgets":10,"peak_rss_kb":1000},
+        "gallery":{"error":"failed"},
+    }}
+    new = {"results":{
+        "navigation":navigation([0.010,0.012],[0.002,0.003],5000,200),
+        "labels":{"build_ms":benchmark.summarize([0.105]),"tcl_commands":2000,"widgets":10,"peak_rss_kb":2000},
+        "gallery":{"build_ms":benchmark.summarize([1.0]),"tcl_commands":1,"widgets":1,"peak_rss_kb":1},
+    }}
+    assert benchmark.summarize([0.001,0.003,0.002]) == {"min":1.0,"median":2.0,"max":3.0}
+    assert benchmark.compare(old,new,0.10) == [("navigation","warm_tcl_commands",1.0),("labels","peak_rss_kb",1.0)]
+    assert "gallery" not in capsys.readouterr().out
+
+def test_build_profiler_traces_a_headless_build(tmp_path):
+    import json
+    profiler = gui_engine.BuildProfiler().enable()
+    try:
+        w = build(tmp_path,PAGE)
+    finally:
+        profiler.disable()
+    assert gui_engine.PROFILER is None
+    events = {(e["category"],e["name"],e["id"]):e for e in profiler.events}
+    form = events[("body","form","login")]
+    user = events[("body","input","user")]
+    assert user["depth"] == form["depth"]+1
+    assert form["start"] <= user["start"] and user["start"]+user["duration"] <= form["start"]+form["duration"]
+    assert form["widgets"] >= user["widgets"] >= 1
+    assert form["self"] <= form["duration"]
+    trace = json.loads(profiler.export_chrome_trace(str(tmp_path/"trace.json")))
+    assert json.loads((tmp_path/"trace.json").read_text()) == trace
+    assert len(trace["traceEvents"]) == len(profiler.events)
+    assert {"form#login","input#user"} <= {event["name"] for event in trace["traceEvents"]}
+    assert "form" in profiler.summary()
+    w.destroy()
+
+def test_layout_scheduler_merges_jobs():
+    root = gui_engine.LayoutWidget()
+    scheduler = gui_engine.LayoutScheduler(root)
+    runs = []
+    for size in (100,200,300):
+        scheduler.schedule("scrollregion",lambda size=size: runs.append(("scrollregion",size)))
+    scheduler.schedule("labels",lambda: runs.append(("labels",0)))
+    assert len(root._after) == 1
+    root.update()
+    assert runs == [("scrollregion",300),("labels",0)]
+    assert root._after == {}
+
+    scheduler.pause()
+    scheduler.pause()
+    scheduler.schedule("scrollregion",lambda: runs.append(("paused",1)))
+    root.update()
+    scheduler.resume()
+    root.update()
+    assert runs[2:] == []
+    scheduler.resume()
+    root.update()
+    assert runs[2:] == [("paused",1)]
+
+    scheduler.schedule("scrollregion",lambda: runs.append(("cancelled",1)))
+    scheduler.cancel()
+    root.update()
+    assert runs[3:] == []
+
+def test_navigator_keeps_pages_alive(tmp_path,monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    os.mkdir("gui_pages")
+    for name in ("a","b","c"):
+        write_page(tmp_path,f"gui_pages/{name}.html",f'<html><head></head><body><label>{name}</label><form><input type="text" name="user"/></form></body></html>')
+    root = build(tmp_path,PAGE)
+    navigator = gui_engine.Navigator(root,max_pages=1)
+    monkeypatch.setattr(Window,"navigator",navigator)
+    root.goto_link("a.html")
+    a = navigator.current.window
+    assert a.toolkit is HeadlessToolkit
+    a.form.get_field("user").data.set("alice")
+    a.goto_link("b.html")
+    b = navigator.current.window
+    assert a.win.options["state"] == "withdrawn"
+    assert navigator.back()
+    assert navigator.current.window is a
+    assert "state" not in a.win.options
+    assert a.form.get_field("user").data.get() == "alice"
+    assert navigator.forward()
+    assert navigator.current.window is b
+    assert not navigator.forward()
+
+    """only one hidden page fits, so opening c evicts a, the least recently used one"""
+    b.goto_link("c.html")
+    assert a.destroyed and not b.destroyed
+    assert navigator.stats()["hidden"] == 1 and navigator.stats()["evictions"] == 1
+    assert navigator.back() and navigator.current.window is b
+    assert navigator.back()
+    rebuilt = navigator.current.window
+    assert rebuilt is not a and rebuilt.form.get_field("user").data.get() == ""
+    assert navigator.back() and navigator.current.window is root
+    assert not navigator.back()
+    navigator.clear()
+    assert navigator.stats()["hidden"] == 0
+    root.destroy()